@@ -0,0 +1,290 @@
+import argparse, json, os, re, shutil, statistics, subprocess, sys, tempfile, time
+import numpy as np
+
+
+class Bench:
+    def __init__(self) -> None:
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        self.module = ["rheast", "unaids", "predict", "forest", "main"]
+        self.heavy = ["numpy", "pandas", "scipy", "sklearn", "matplotlib", "geopandas"]
+        self.stage = ["ingest", "fit_all", "growth", "forest", "render"]
+        self.base = os.path.join(self.path, "cache", "bench.json")
+        return
+
+    def synthetic(self, path, country=50, year=35, seed=0):
+        import pandas as pd  # pip install pandas openpyxl
+        from unaids import unaids
+
+        rng, file = np.random.default_rng(seed), os.path.join(path, "file")
+        os.makedirs(file, exist_ok=True)
+        path = os.path.join(self.path, "file", "LGBT score.js.txt")
+        with open(path, "r", encoding="utf-8") as f:
+            code = json.loads(f.read().split(" = ")[-1].split(";")[0])
+        # names go into comma-separated and quoted files, so drop both characters
+        code = {a: re.sub("[',]", "", b["country"]) for a, b in sorted(code.items())}
+        more = range(max(country - len(code), 0))
+        code.update({f"Q{i}": f"Country {i}" for i in more})
+        name = rng.permutation(list(code))[:country]
+        region = {a: unaids.world[1:][i % 8] for i, a in enumerate(name)}
+        time = np.arange(1990, 1990 + year)
+
+        # people living with HIV, new infections and the 95-95-95 cascade
+        size = rng.lognormal(10, 1.6, (country, 1))
+        grow = rng.uniform(-0.05, 0.05, (country, 1))
+        plhiv = size * np.exp(grow * (time - 1990))
+        plhiv = plhiv * rng.uniform(0.98, 1.02, (country, year))
+        new = plhiv * rng.uniform(0.02, 0.08, (country, 1))
+        mid = rng.uniform(2000, 2020, (country, 3))
+        step = 0.3 + 0.67 / (1 + np.exp(-0.3 * (time[None, None, :] - mid[:, :, None])))
+        block = {"Global": list(range(country))}
+        for i, a in enumerate(name):
+            block[region[a]] = block.get(region[a], []) + [i]
+        rows = ["Global"]
+        for i in unaids.world[1:]:
+            rows += [i, *name[block.get(i, [])]]
+
+        sheet = {i: [[None] * 90 for _ in range(7)] for i in range(4)}
+        for a in rows:
+            i = block.get(a, [list(name).index(a)] if a in name else [])
+            a, p, n, s = code.get(a, a), plhiv[i].sum(0), new[i].sum(0), step[i].mean(0)
+            for t in range(year):
+                one, three = [None] * 90, [None] * 90
+                one[0] = three[0] = time[t]
+                one[2] = three[2] = a
+                one[27], one[30] = self.cell(rng, p[t] * 0.98), self.cell(rng, p[t])
+                one[31], one[32] = round(p[t] * 0.9), round(p[t] * 1.1)
+                one[48] = self.cell(rng, n[t])
+                for j, e in enumerate(np.cumprod(s[:, t])):
+                    three[78 + 5 * j] = self.cell(rng, p[t] * e)
+                for j, e in zip([3, 33, 63], s[:, t] * 100):
+                    e = ">95" if e > 95 else round(e)
+                    three[j] = three[j + 6 + (j == 3)] = e
+                sheet[1].append(one), sheet[3].append(three)
+        sheet[0], sheet[2] = sheet[1], sheet[1]
+        path = os.path.join(file, "HIV_estimates_from_1990-to-present.xlsx")
+        with pd.ExcelWriter(path) as f:
+            for i in sheet:
+                data = pd.DataFrame(sheet[i], columns=[None] * 90)
+                data.to_excel(f, sheet_name=f"Sheet{i}", index=False)
+
+        name = [code[i] for i in name]
+        score = {a: {"ei": int(rng.integers(0, 100))} for a in code if code[a] in name}
+        path = os.path.join(file, "LGBT score.json.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"issue": [], "values": [], "regions": score}))
+        path = os.path.join(file, "LGBT score.js.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            data = {a: {"country": code[a]} for a in score}
+            f.write(f"window.countries2 = {json.dumps(data)};\nreturn countries2;")
+        path = os.path.join(file, "Sex education.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            data = [name[i::4] or ["Nowhere"] for i in range(4)]
+            data = [f"Level {i}\n" + ", ".join(e) for i, e in enumerate(data)]
+            f.write("\n\n".join(data))
+        data = [["Data Source", None, 2023]] * 3
+        data += [[a, None, round(float(rng.uniform(10, 95)), 3)] for a in name]
+        path = os.path.join(file, "Urban population.xls")
+        pd.DataFrame(data).to_excel(path, index=False, engine="openpyxl")
+        data = [[None] * 7] * 3 + [
+            [None, a, None, y, f"TOTAL GRAND {y}", float(rng.uniform(1e5, 1e8)), None]
+            for a in name
+            for y in (2021, 2022)
+        ]
+        pd.DataFrame(data).to_excel(os.path.join(file, "Funding.xlsx"), index=False)
+        path = "ne_110m_admin_0_countries.zip"
+        shutil.copy(os.path.join(self.path, "file", path), os.path.join(file, path))
+        return file
+
+    def cell(self, rng, value):
+        value, i = float(value), rng.random()
+        if i < 0.02:
+            return "..."
+        if value < 100:
+            return "<100"
+        if value >= 1e6 and i < 0.3:
+            return f"{value / 1e6:.1f}m"
+        return f"{value:,.0f}".replace(",", " ") if i < 0.6 else round(value)
+
+    def case(self):
+        from collections import OrderedDict
+        from probe import probe
+        from rheast import rheast
+        from unaids import unaids
+        from predict import predict
+        from forest import forest
+
+        probe.start(os.path.join(rheast.cache, "bench.jsonl"))
+        clock, data = {}, {}
+        start = time.perf_counter()
+        unaids.sheets = unaids.read()
+        for i in [(1, 27), (1, 30), (1, 48), (3, 78), (3, 83), (3, 88)]:
+            unaids.book_col(unaids.book_get(i[0]), i[1])
+        clock["ingest"] = time.perf_counter() - start
+
+        name = [i for i in unaids.book_get(1)["rows"] if not i in unaids.world]
+        data = [unaids.sheet_get(i) for i in name]
+        data += [[a, b / 100] for a, b in [unaids.sheet_get(i, (3, 78)) for i in name]]
+        data = [i for i in data if len(i[0]) > 1]
+        rheast.memo, start = OrderedDict(), time.perf_counter()
+        rheast.fit_many(data)
+        clock["fit_all"] = time.perf_counter() - start
+
+        image = predict.all(predict.run_world()[0])
+        start = time.perf_counter()
+        predict.growth(image)
+        clock["growth"] = time.perf_counter() - start
+
+        predict.run_area()
+        forest.run()
+        span = lambda name: sum(i["dur"] for i in probe.event if i["name"] in name)
+        clock["forest"] = span(["forest.forest"])
+        clock["render"] = span(["render.run"])
+        return clock
+
+    # ratio series in (0, 1): sigmoids, flat lines and drifts, 5-11 points each
+    def parity_data(self, count, seed):
+        rng, matrix = np.random.default_rng(seed), []
+        for i in range(count):
+            n, t = rng.integers(5, 12), rng.integers(2005, 2016)
+            x, e = np.arange(t, t + n, dtype=float), rng.normal(0, 0.02, n)
+            if i % 3 == 0:
+                a, b = rng.uniform(0.5, 1), rng.uniform(0.05, 0.6)
+                y = a / (1 + np.exp(-b * (x - rng.uniform(1995, 2030)))) + e
+            else:
+                a, b = rng.uniform(0.2, 0.9), rng.uniform(-0.03, 0.03) * (i % 3 - 1)
+                y = a + b * (x - t) + e / 2
+            matrix.append([x, np.clip(y, 0.001, 0.999)])
+        return matrix
+
+    def parity(self, count=300, seed=0, tol=1e-6):
+        from collections import OrderedDict
+        from rheast import rheast
+
+        data = self.parity_data(count, seed)
+        rheast.memo = OrderedDict()
+        (lm, done), fit = rheast.fit_sig(data, flag=True), []
+        lm_r2 = [rheast.memo_key(x, y, rheast.sig, solver="lm") for x, y in data]
+        lm_r2 = [rheast.memo[i][0] for i in lm_r2]
+        rheast.memo = OrderedDict()
+        for i in data:
+            fit.append(rheast.fit(i, rheast.sig)[0])
+        rheast.memo, rheast.dirty = None, False
+        # only kept models (R2 > 0.8 either way) have to match; below that both
+        # solvers chase noise into different poor minima and the fit is dropped
+        lm_r2, fit = np.array(lm_r2), np.array(fit)
+        keep, lm = np.maximum(lm_r2, fit) > 0.8, np.array([i != [] for i in lm])
+        worse, lost = (lm_r2 < fit - tol) & keep, (fit > 0.8) & ~lm
+        matrix = [["series", count], ["curve_fit fallback", int((~done).sum())]]
+        matrix += [["lower R2, kept", int(worse.sum())]]
+        matrix += [["models lost", int(lost.sum())]]
+        matrix += [["models gained", int((lm & (fit <= 0.8)).sum())]]
+        matrix += [["lower R2, dropped", int(((lm_r2 < fit - tol) & ~keep).sum())]]
+        matrix += [["max R2 gap, kept", float((fit - lm_r2)[keep].max(initial=0))]]
+        return matrix, bool(worse.any() or lost.any())
+
+    def run(self, size=[50, 200], year=35, save=False, limit=0.2, repeat=3):
+        matrix, base, fail = [], {}, False
+        if os.path.exists(self.base):
+            with open(self.base, "r", encoding="utf-8") as f:
+                base = json.loads(f.read())
+        for n in size:
+            path = os.path.join(self.path, "cache", "bench", f"{n}x{year}")
+            if not os.path.exists(os.path.join(path, "file")):
+                self.synthetic(path, n, year)
+            shutil.rmtree(os.path.join(path, "cache"), ignore_errors=True)
+            sets = {"cwd": self.path, "capture_output": True, "text": True}
+            sets["env"] = {**os.environ, "RHEAST_DATA": path, "MPLBACKEND": "Agg"}
+            clock, key = {}, f"{n}x{year}"
+            for _ in range(repeat):
+                data = [sys.executable, os.path.join(self.path, "bench.py"), "case"]
+                data = subprocess.run(data, **sets)
+                if data.returncode:
+                    raise RuntimeError(data.stderr.strip().split("\n")[-1])
+                data = json.loads(data.stdout.strip().split("\n")[-1])
+                clock = {i: min(data[i], clock.get(i, data[i])) for i in data}
+            for i in self.stage:
+                a, b = clock[i], base.get(key, {}).get(i)
+                flag = "" if b is None else f"{a / b:.2f}x" if b else "-"
+                if b and a > b * (1 + limit) and a - b > 0.05:
+                    flag, fail = f"{flag} REGRESSION", True
+                matrix.append([key, i, a, "" if b is None else b, flag])
+            base[key] = clock if save else base.get(key, clock)
+        if save:
+            os.makedirs(os.path.dirname(self.base), exist_ok=True)
+            with open(self.base, "w", encoding="utf-8") as f:
+                f.write(json.dumps(base, indent=2))
+        return matrix, fail
+
+    def imports(self, module=[], repeat=5):
+        matrix = []
+        for name in module or self.module:
+            with tempfile.TemporaryDirectory() as cache:
+                cold, heavy = self.imports_one(name, cache)
+                warm = [self.imports_one(name, cache)[0] for _ in range(repeat)]
+            matrix.append([name, cold, statistics.median(warm), heavy])
+        return matrix
+
+    def imports_one(self, name, cache):
+        code = [
+            "import json, sys, time",
+            "t = time.perf_counter()",
+            f"import {name}",
+            "t = time.perf_counter() - t",
+            f"print(json.dumps([t, [i for i in {self.heavy} if i in sys.modules]]))",
+        ]
+        sets = {"cwd": self.path, "capture_output": True, "text": True}
+        sets["env"] = {**os.environ, "PYTHONPYCACHEPREFIX": cache}
+        data = subprocess.run([sys.executable, "-c", "\n".join(code)], **sets)
+        if data.returncode:
+            raise RuntimeError(data.stderr.strip().split("\n")[-1])
+        return json.loads(data.stdout.strip().split("\n")[-1])
+
+    def table(self, head, matrix):
+        text = lambda i: f"{i:.3f}" if isinstance(i, float) else str(i)
+        rows = [head] + [[text(i) for i in e] for e in matrix]
+        size = [max(len(e[i]) for e in rows) for i in range(len(head))]
+        rows = ["  ".join(e.ljust(size[i]) for i, e in enumerate(e)) for e in rows]
+        return "\n".join(rows)
+
+
+bench = Bench()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pipeline benchmarks")
+    stage = parser.add_subparsers(dest="stage", required=True)
+    sets = stage.add_parser("import", help="cold and warm import time per module")
+    sets.add_argument("module", nargs="*", help=f"default: {' '.join(bench.module)}")
+    sets.add_argument("--repeat", type=int, default=5, help="warm runs (median)")
+    sets = stage.add_parser("run", help="time pipeline stages on synthetic data")
+    sets.add_argument("--size", type=int, nargs="+", default=[50, 200])
+    sets.add_argument("--year", type=int, default=35, help="years per series")
+    sets.add_argument("--save", action="store_true", help="store as new baseline")
+    sets.add_argument("--limit", type=float, default=0.2, help="regression margin")
+    sets.add_argument("--repeat", type=int, default=3, help="runs per size (min)")
+    sets = stage.add_parser("data", help="write a synthetic input directory")
+    sets.add_argument("path")
+    sets.add_argument("--size", type=int, default=50, help="countries")
+    sets.add_argument("--year", type=int, default=35, help="years per series")
+    sets = stage.add_parser("parity", help="batched sigmoid fits against curve_fit")
+    sets.add_argument("--count", type=int, default=300, help="synthetic series")
+    sets.add_argument("--seed", type=int, default=0)
+    stage.add_parser("case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage == "import":
+        matrix = bench.imports(args.module, args.repeat)
+        print(bench.table(["module", "cold (s)", "warm (s)", "loads"], matrix))
+    if args.stage == "run":
+        sets = [args.size, args.year, args.save, args.limit, args.repeat]
+        matrix, fail = bench.run(*sets)
+        head = ["size", "stage", "time (s)", "baseline (s)", "ratio"]
+        print(bench.table(head, matrix))
+        sys.exit(1 if fail else 0)
+    if args.stage == "parity":
+        matrix, fail = bench.parity(args.count, args.seed)
+        print(bench.table(["check", "value"], matrix))
+        sys.exit(1 if fail else 0)
+    if args.stage == "data":
+        print(bench.synthetic(args.path, args.size, args.year))
+    if args.stage == "case":
+        print(json.dumps(bench.case()))
@@ -0,0 +1,138 @@
+import json, os, re, unicodedata
+import numpy as np
+from probe import probe
+from rheast import rheast
+
+
+class Country:
+    def __init__(self) -> None:
+        self.field = ["NAME_LONG", "ADMIN", "NAME_EN", "NAME_SORT", "NAME_ALT"]
+        self.field += ["FORMAL_EN", "NAME_CIAWF", "GEOUNIT", "BRK_NAME"]
+        self.field += ["ISO_A2_EH", "ISO_A3_EH", "ADM0_A3", "WB_A3"]
+        self.alias = [
+            ["BHS", "Bahamas", "Bahamas, The"],
+            ["BOL", "Bolivia (Plurinational State of)"],
+            ["BRN", "Brunei Darussalam"],
+            ["CIV", "Cote dIvoire", "Cote d'Ivoire", "Côte d'Ivoire"],
+            ["COD", "Democratic Republic of the Congo", "Congo, Dem. Rep."],
+            ["COD", "Congo, the Democratic Republic of the", "Congo (Kinshasa)"],
+            ["COD", "Congo, Democratic Republic of the"],
+            ["COD", "Democratic Republic of Congo", "Congo, Dem. Rep. of the"],
+            ["COD", "DR Congo", "Congo DR", "Dem. Rep. Congo", "Zaire"],
+            ["COG", "Congo", "Congo, Rep."],
+            ["COG", "Republic of the Congo", "Congo (Brazzaville)"],
+            ["CPV", "Cape Verde", "Cabo Verde"],
+            ["CZE", "Czech Republic", "Czechia"],
+            ["EGY", "Egypt", "Egypt, Arab Rep."],
+            ["FSM", "Micronesia, Federated States of", "Micronesia, Fed. Sts."],
+            ["FSM", "Micronesia (Federated States of)"],
+            ["GBR", "United Kingdom of Great Britain and Northern Ireland"],
+            ["GMB", "Gambia", "Gambia, The"],
+            ["IRN", "Iran (Islamic Republic of)", "Iran, Islamic Rep."],
+            ["KGZ", "Kyrgyzstan", "Kyrgyz Republic"],
+            ["KOR", "Republic of Korea", "Korea, Rep."],
+            ["LAO", "Lao People's Democratic Republic", "Lao PDR"],
+            ["LAO", "Lao People Democratic Republic"],
+            ["MDA", "Republic of Moldova"],
+            ["MKD", "North Macedonia"],
+            ["PRK", "Democratic People's Republic of Korea"],
+            ["PRK", "Korea, Dem. People's Rep."],
+            ["PSE", "State of Palestine", "West Bank and Gaza"],
+            ["RUS", "Russian Federation"],
+            ["SVK", "Slovakia", "Slovak Republic"],
+            ["SWZ", "Eswatini", "Swaziland"],
+            ["SYR", "Syrian Arab Republic"],
+            ["TLS", "Timor-Leste"],
+            ["TUR", "Türkiye", "Turkiye"],
+            ["TZA", "United Republic of Tanzania"],
+            ["USA", "United States"],
+            ["VEN", "Venezuela (Bolivarian Republic of)", "Venezuela, RB"],
+            ["VNM", "Viet Nam", "Vietnam"],
+            ["YEM", "Yemen", "Yemen, Rep."],
+        ]
+        self.code, self.name, self.index, self.miss = [], [], {}, {}
+        self.cut = {}
+        self.ready = False
+        return
+
+    def build(self):
+        if self.ready:
+            return self
+        self.ready = True
+        with probe.span("country.build"):
+            path = os.path.join(rheast.file, "ne_110m_admin_0_countries.zip")
+            if os.path.exists(path):
+                data = rheast.load(path, lambda: self.read(path), "country")
+                for i in data.to_dict("records"):
+                    code = i["ADM0_A3"] if i["ISO_A3_EH"] == "-99" else i["ISO_A3_EH"]
+                    self.add(code, i["NAME"], *[i[e] for e in self.field])
+            path = os.path.join(rheast.file, "LGBT score.js.txt")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.loads(f.read().split(" = ")[-1].split(";")[0])
+                for a, b in data.items():
+                    i = self.get(a)
+                    self.add(a, b["country"]) if i < 0 else self.put(i, b["country"])
+            for a, *b in self.alias:
+                i = self.get(a) if self.get(a) >= 0 else self.get(b[0])
+                i = self.add(a, b[0]) if i < 0 else i
+                for e in [a, *b]:
+                    self.put(i, e, True)
+            # a trimmed name is an alias only when one country trims to it
+            for a, b in self.cut.items():
+                if len(b) == 1:
+                    self.put(*b, a)
+        return self
+
+    def read(self, path):
+        import geopandas as gpd  # pip install geopandas
+
+        data = gpd.read_file(path, ignore_geometry=True)
+        return data[["NAME", *self.field]]
+
+    def add(self, code, name, *alias):
+        i = len(self.code)
+        self.code.append(code), self.name.append(name)
+        for e in [code, name, *alias]:
+            self.put(i, e)
+        self.cut.setdefault(self.key(self.trim(name)), set()).add(i)
+        return i
+
+    def put(self, i, name, force=False):
+        name = self.key(name)
+        if name and (force or name not in self.index):
+            self.index[name] = i
+        return
+
+    def get(self, name):
+        return self.index.get(self.key(name), -1)
+
+    def trim(self, name):
+        return str(name).split(",")[0].split("(")[0]
+
+    def key(self, name):
+        if not isinstance(name, str) or name in ["-99", ""]:
+            return ""
+        name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+        name = name.lower().replace("&", " and ").replace("'", "").replace("’", "")
+        return re.sub(r"[^a-z0-9]+", " ", name).strip()
+
+    def ids(self, name, source="", add=False):
+        self.build()
+        name, sets = list(name), {}
+        for e in set(name):
+            sets[e] = self.get(e) if self.key(e) else -2
+            if sets[e] == -1:
+                self.miss.setdefault(source, set()).add(str(e))
+                sets[e] = self.add(None, e) if add else -1
+        return np.array([max(sets[e], -1) for e in name], dtype=int)
+
+    def report(self, path=None):
+        data = {a: sorted(b) for a, b in sorted(self.miss.items())}
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(data, ensure_ascii=False, indent=2))
+        return data
+
+
+country = Country()
@@ -1,10 +1,10 @@
 import json, os
 import numpy as np
-import pandas as pd  # pip install pandas openpyxl xlrd
-import matplotlib.pyplot as plt  # pip install matplotlib
-import matplotlib.lines as mlines
-from sklearn.ensemble import RandomForestRegressor  # pip install scikit-learn
+from country import country
+from probe import probe
+from render import render
 from rheast import rheast
+from store import store
 from unaids import unaids
 
 
@@ -23,211 +23,343 @@ class Forest:
             "https://api.worldbank.org/v2/en/indicator/SP.URB.TOTL.IN.ZS?downloadformat=excel",
             "https://hivfinancial.unaids.org/GARPR16-GAM2024ProgrammeExpenditures.xlsx",
         ]
-        plt.rcParams["font.sans-serif"] = "Times New Roman"
-        self.run()
+        self.trees, self.seed, self.repeat, self.jobs = 1000, 8, 5, -1
+        self.grid = {"max_features": [1.0, 0.5], "min_samples_leaf": [1, 3]}
         return
 
-    def run(self, matrix={}):
-        run = [self.val, self.lgb, self.sex, self.urb, self.fun, self.tar]
-        for i in run:
-            matrix = i(matrix)
+    def plot(self):
+        import matplotlib  # pip install matplotlib
+
+        matplotlib.rcParams["font.sans-serif"] = "Times New Roman"
+        return matplotlib
+
+    def run(self, matrix=None):
+        with probe.span("forest.run"), render.batch():
+            return self.run_all({} if matrix is None else matrix)
+
+    def run_all(self, matrix):
+        import pandas as pd  # pip install pandas
+
+        name, deps = ["feature", "importance_0", "importance_1"], self.deps()
+        sets = {"trees": self.trees, "seed": self.seed, "repeat": self.repeat}
+        sets["permutation"] = "oob"
+        sets["info"] = [unaids.info[:9], unaids.info[:2] + unaids.info[-4:]]
+        if not matrix and all(store.fresh(i, deps, sets) for i in name):
+            with probe.span("forest.store"):
+                image = [pd.DataFrame(store.get(i)) for i in name]
+        else:
+            design, image = self.design(self.load(matrix)), []
+            data = dict(zip(design["info"], design["data"].T))
+            image.append(pd.DataFrame({"Country": design["name"], **data}))
+            for info in sets["info"]:
+                self.info = info
+                with probe.span("forest.forest", info=len(self.info)):
+                    image.append(self.forest(design))
+            for i, e in zip(name, image if not matrix else []):
+                store.put(i, e, deps, "forest", sets)
+        table, image = [i.to_string(index=False) for i in image], image[1:]
         path = os.path.join(rheast.image, "output.txt")
         with open(path, "w", encoding="utf-8") as f:
-            f.write(str(matrix))
-        fig, axs = plt.subplots(2, 2, figsize=(12.5, 8))
-        self.info = unaids.info[:9]
-        self.forest(matrix, axs[0, 0], axs[0, 1])
-        self.info = unaids.info[:2] + unaids.info[-4:]
-        self.forest(matrix, axs[1, 0], axs[1, 1])
+            f.write("\n\n".join(table))
+        return render.add("forest", "fig_forest", "output", image)
+
+    def fig_forest(self, image):
+        from matplotlib.figure import Figure
+
+        self.plot()
+        fig = Figure(figsize=(12.5, 8))
+        axs = fig.subplots(2, 2)
+        for i, sets in enumerate(image):
+            self.forest_draw(sets, axs[i, 0], axs[i, 1])
         fig.tight_layout()
-        path = os.path.join(rheast.image, f"output.svg")
-        fig.savefig(path, format="svg")
-        return
+        return fig, {}
+
+    def load(self, matrix):
+        import pandas as pd  # pip install pandas
 
-    def forest(self, matrix, ax1, ax2):
-        data, robot, color = [], [], self.color
-        info = {i: None for i in self.info}
+        run = [self.val, self.lgb, self.sex, self.urb, self.fun, self.tar]
+        for i, e in enumerate(run):
+            with probe.span(f"forest.{e.__name__}"):
+                data = e()
+            table = data if i == 0 else table.join(data, how="left")
+        matrix = {**matrix}
+        for i in table.to_dict("records"):
+            matrix[i["Country"]] = {a: b for a, b in i.items() if not pd.isna(b)}
+        country.report(os.path.join(rheast.image, "country.json"))
+        return matrix
 
-        for i in matrix:
-            arr = {**info, **matrix[i]}
-            if len(str(arr).split("None")) == 1:
-                data.append(arr)
+    def design(self, matrix):
+        info = unaids.info[1:]
+        data = [[matrix[a].get(b) for b in info] for a in matrix]
+        data = np.array(data, dtype=float).reshape(-1, len(info))
+        mask = ~np.isnan(data)
+        return {"name": list(matrix), "info": info, "data": data, "mask": mask}
 
-        x = [[d[i] for i in self.info[2:]] for d in data]
-        y = [d["Growth rate"] for d in data]
-        model = {"n_estimators": 1000, "random_state": 0}
-        rf_model = RandomForestRegressor(**model)
-        rf_model.fit(x, y)
+    def design_get(self, design, clue):
+        col = [design["info"].index(i) for i in ["Growth rate", *clue]]
+        row = design["mask"][:, col].all(1)
+        data = design["data"][row][:, col]
+        return data[:, 1:], data[:, 0], row
+
+    def forest(self, design):
+        import pandas as pd  # pip install pandas
+        from joblib import Parallel, delayed  # pip install scikit-learn
+
+        robot = []
+        x, y, _ = self.design_get(design, self.info[2:])
+        trees = max(self.trees // self.seed, 1)
+        with probe.span("forest.ensemble", seed=self.seed, trees=trees):
+            run = (delayed(self.forest_fit)(x, y, i, trees) for i in range(self.seed))
+            imp, per = zip(*Parallel(n_jobs=self.jobs)(run))
 
         for i, e in enumerate(self.info[2:]):
-            a = np.corrcoef([d[e] for d in data], y)[0, 1]
+            a = np.corrcoef(x[:, i], y)[0, 1]
             robot.append("+" if a > 0 else "-")
 
-        imp = [round(i * 100, 2) for i in rf_model.feature_importances_]
-        sets = {"Clue": self.info[2:], "Importance": imp, "Correlation": robot}
-        sets = pd.DataFrame(sets)
-        sets = sets.sort_values(by="Importance", ascending=False)
+        imp, imp_ci = self.forest_ci(np.array(imp))
+        per, per_ci = self.forest_ci(np.concatenate(per))
+        sets = {"Clue": self.info[2:], "Importance": imp, "CI": imp_ci}
+        sets = {**sets, "OOB permutation": per, "OOB permutation CI": per_ci}
+        sets = pd.DataFrame({**sets, "Correlation": robot})
+        return sets.sort_values(by="Importance", ascending=False)
+
+    def forest_draw(self, sets, ax1, ax2):
+        import matplotlib.lines as mlines
 
-        mark = {"labels": sets["Clue"], "colors": color[: len(sets)]}
+        color = self.color
+        label = [f"{a}\n±{b:.2f}%" for a, b in zip(sets["Clue"], sets["CI"])]
+        mark = {"labels": label, "colors": color[: len(sets)]}
         mark = {**mark, "autopct": lambda i: f"{i:.2f}%" if i > 0 else ""}
         mark = {**mark, "textprops": {"color": "white"}, "labeldistance": 1.1}
         mark = {**mark, "wedgeprops": {"linewidth": 1, "edgecolor": "white"}}
         mark = {**mark, "pctdistance": 0.8, "startangle": 90}
         ax1.pie(sets["Importance"], **mark)
         for text in ax1.texts:
-            if text.get_text() in sets["Clue"].values:
+            if text.get_text() in label:
                 text.set_color("black")
         ax1.axis("equal")
 
-        width = (len(self.info) - 3) * 0.08
+        width = (len(sets) - 1) * 0.08
         colors = [color[4] if i == "+" else color[0] for i in sets["Correlation"]]
-        ax2.bar(sets["Clue"], sets["Importance"], color=colors, width=width, zorder=5)
+        mark = {"color": colors, "width": width, "zorder": 5, "yerr": sets["CI"]}
+        mark = {**mark, "error_kw": {"capsize": 3, "elinewidth": 1}}
+        ax2.bar(sets["Clue"], sets["Importance"], **mark)
+        mark = {"yerr": sets["OOB permutation CI"], "fmt": "D", "color": color[7]}
+        mark = {**mark, "markersize": 5, "capsize": 3, "zorder": 6}
+        ax2.errorbar(sets["Clue"], sets["OOB permutation"], **mark)
         ax2.set_ylabel("Importance"), ax2.set_yticks(ax2.get_yticks())
         ax2.set_yticklabels([f"{i:.0f}%" for i in ax2.get_yticks()])
         ax2.tick_params(axis="x", rotation=20)
         ax2.grid(True, color=self.border, linestyle="--")
         for e in ["top", "right"]:
             ax2.spines[e].set_color(self.border)
-        for x, y in zip(sets["Clue"], sets["Importance"]):
-            ax2.text(x, y + 0.5, f"{y:.2f}%", ha="center", va="bottom", fontsize=9)
+        for x, y, e in zip(sets["Clue"], sets["Importance"], sets["CI"]):
+            ax2.text(x, y + e + 0.5, f"{y:.2f}%", ha="center", va="bottom", fontsize=9)
         mark = [("Negative correlation", 0), ("Positive correlation", 4)]
         mark = [{"label": a, "markerfacecolor": color[b]} for (a, b) in mark]
         mark = [{"marker": "o", "color": "w", "markersize": 7.5, **i} for i in mark]
+        line = {"label": "OOB permutation importance", "markerfacecolor": color[7]}
+        mark.append({**mark[0], **line, "marker": "D"})
         mark = [mlines.Line2D([], [], **i) for i in mark]
         ax2.legend(handles=mark, loc="upper right")
         return
 
-    def val(self, matrix):
-        path = os.path.join(rheast.image, "fig__bar.txt")
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.loads(f.read().replace("'", '"'))
-            for a, b in data:
-                a = self.name(a)
-                matrix[a] = {"Country": a, "Growth rate": b}
-        return matrix
+    def forest_fit(self, x, y, seed, trees):
+        from sklearn.ensemble import RandomForestRegressor  # pip install scikit-learn
+
+        model = {"n_estimators": trees, "random_state": seed, "n_jobs": 1}
+        model = RandomForestRegressor(**model).fit(x, y)
+        (n, k), rng = x.shape, np.random.default_rng(seed)
+        data = np.repeat(x[None, None], k, 0).repeat(self.repeat, 1)
+        for i in range(k):
+            data[i, :, :, i] = rng.permuted(data[i, :, :, i], axis=1)
+        data = np.vstack([x, data.reshape(-1, k)])
+        # scored out of bag: each row only by the trees that did not draw it
+        oob = np.ones((trees, n), dtype=bool)
+        for i, e in enumerate(model.estimators_samples_):
+            oob[i, e] = False
+        pred = np.array([e.predict(data) for e in model.estimators_])
+        pred, keep = (pred.reshape(trees, -1, n) * oob[:, None]).sum(0), oob.any(0)
+        pred = pred[:, keep] / oob.sum(0)[keep]
+        sse = ((pred - y[keep]) ** 2).sum(1)
+        per = (sse[1:] - sse[0]).reshape(k, -1).T.clip(0)
+        per = per / np.maximum(per.sum(1, keepdims=True), 1e-12)
+        return model.feature_importances_, per
+
+    def sweep(self, matrix=None, size=None, grid=None, trees=100):
+        import itertools
+        import pandas as pd  # pip install pandas
+        from joblib import Parallel, delayed  # pip install scikit-learn
+
+        with probe.span("forest.sweep"):
+            design = self.design(self.load({} if matrix is None else matrix))
+            clue, grid = unaids.info[2:], grid or self.grid
+            size = size or [2, 3, len(clue)]
+            subs = [c for n in size for c in itertools.combinations(clue, n)]
+            sets = [dict(zip(grid, i)) for i in itertools.product(*grid.values())]
+            run = [(a, {"n_estimators": trees, **b}) for a in subs for b in sets]
+            with probe.span("forest.sweep_fit", config=len(run)):
+                run = (delayed(self.sweep_fit)(design, a, b) for a, b in run)
+                data = Parallel(n_jobs=self.jobs)(run)
+            data = pd.DataFrame([i for i in data if i is not None])
+            data = data.sort_values(by="OOB", ascending=False, ignore_index=True)
+            path = os.path.join(rheast.image, "sweep.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(data.to_string())
+        return data
+
+    def sweep_fit(self, design, clue, sets):
+        from sklearn.ensemble import RandomForestRegressor  # pip install scikit-learn
+
+        x, y, _ = self.design_get(design, clue)
+        if len(y) < 5:
+            return None
+        model = {**sets, "oob_score": True, "random_state": 0, "n_jobs": 1}
+        model = RandomForestRegressor(**model).fit(x, y)
+        imp = [round(i * 100, 2) for i in model.feature_importances_]
+        data = {"Clue": ", ".join(clue), "Rows": len(y), "OOB": model.oob_score_}
+        data = {**data, **{a: b for a, b in sets.items() if a != "n_estimators"}}
+        return {**data, "Importance": dict(zip(clue, imp))}
 
-    def lgb(self, matrix):
-        data, trans = {}, {}
+    def forest_ci(self, data):
+        mean, n = data.mean(0), len(data)
+        half = 1.96 * data.std(0, ddof=1) / np.sqrt(n) if n > 1 else 0 * mean
+        return np.round(mean * 100, 2), np.round(half * 100, 2)
+
+    def deps(self):
+        path = ["LGBT score.json.txt", "LGBT score.js.txt", "Sex education.txt"]
+        path += ["Urban population.xls", "Funding.xlsx"]
+        path += ["ne_110m_admin_0_countries.zip"]
+        return ["growth", unaids.xlsx, *[os.path.join(rheast.file, i) for i in path]]
+
+    def val(self):
+        import pandas as pd  # pip install pandas
+
+        data = store.get("growth", {"name": "U", "rate": "f8"})
+        data = zip(data["name"].tolist(), data["rate"].tolist())
+        data = pd.DataFrame(data, columns=["Country", "Growth rate"], dtype=object)
+        data = data.set_axis(country.ids(data["Country"], "unaids", add=True))
+        data["Country"] = self.name_map(data["Country"])
+        return data.groupby(level=0, sort=False).last()
+
+    def lgb(self):
         path = os.path.join(rheast.file, "LGBT score.json.txt")
         with open(path, "r", encoding="utf-8") as f:
             data = json.loads(f.read())["regions"]
-        path = os.path.join(rheast.file, "LGBT score.js.txt")
-        with open(path, "r", encoding="utf-8") as f:
-            trans = json.loads(f.read().split(" = ")[-1].split(";")[0])
-        for i in trans:
-            if i in data:
-                a, b = trans[i]["country"], data[i]["ei"]
-                a = self.name(a)
-                if a in matrix:
-                    matrix[a]["LGBT score"] = b
-        return matrix
+        data = {a: b for a, b in data.items() if "-" not in a}
+        score = [i["ei"] for i in data.values()]
+        return self.key(data, {"LGBT score": score}, "equaldex")
 
-    def sex(self, matrix):
+    def sex(self):
         path = os.path.join(rheast.file, "Sex education.txt")
         with open(path, "r", encoding="utf-8") as f:
             data = f.read().split("\n\n")
-            for i, e in enumerate(data):
-                arr = [n.strip(" ") for n in e.split("\n")[1].split(",")]
-                for a in arr:
-                    if a in matrix:
-                        matrix[a]["Sex education"] = len(data) - i - 1
-        return matrix
+        name, level = [], []
+        for i, e in enumerate(data):
+            arr = [n.strip(" ") for n in e.split("\n")[1].split(",")]
+            name, level = name + arr, level + [len(data) - i - 1] * len(arr)
+        return self.key(name, {"Sex education": level}, "sex education")
+
+    def urb(self):
+        import pandas as pd  # pip install pandas xlrd
 
-    def urb(self, matrix):
         path = os.path.join(rheast.file, "Urban population.xls")
-        data = pd.read_excel(path, sheet_name=0, engine="xlrd")
+        data = pd.read_excel(path, sheet_name=0)
         data = data[data.index > 2].iloc[:, [0, -1]]
-        for _, (a, b) in data.iterrows():
-            a = self.name(a)
-            b = float(b)
-            if a in matrix and b > 0:
-                matrix[a]["Urban population"] = b
-        return matrix
+        value = pd.to_numeric(data.iloc[:, 1], errors="coerce")
+        data = data[value.to_numpy() > 0]
+        value = value[value > 0].astype(float).to_numpy()
+        return self.key(data.iloc[:, 0], {"Urban population": value}, "world bank")
+
+    def fun(self):
+        import pandas as pd  # pip install pandas openpyxl
 
-    def fun(self, matrix):
         path = os.path.join(rheast.file, "Funding.xlsx")
         data = pd.read_excel(path, sheet_name=0)
         data = data[data.index > 2].iloc[:, [1, 3, 4, -2]]
-        robot = {}
-        for _, (name, year, sub, val) in data.iterrows():
-            if len(sub.split("TOTAL GRAND")) > 1:
-                if not name in robot:
-                    robot[name] = []
-                robot[name].append([year, val])
-        for a in robot:
-            e = sorted(robot[a], key=lambda i: (i[1], i[0]))
-            a = self.name(a)
-            if a in matrix:
-                matrix[a]["Funding"] = e[-1][-1]
-        return matrix
+        data.columns = ["name", "year", "sub", "val"]
+        data = data[data["sub"].astype(str).str.contains("TOTAL GRAND", regex=False)]
+        order = data["name"].unique()
+        sets = {"na_position": "first", "kind": "stable"}
+        data = data.sort_values(by=["val", "year"], **sets)
+        data = data.drop_duplicates("name", keep="last").set_index("name")["val"]
+        data = data.reindex(order)
+        return self.key(data.index, {"Funding": data.to_numpy()}, "funding")
+
+    def tar(self):
+        import pandas as pd  # pip install pandas
 
-    def tar(self, matrix):
+        target = [f"{i} 95 target" for i in ["First", "Second", "Third"]]
         data = unaids.data[3].iloc[6:, [2, 3, 10, 33, 39, 63, 69]]
-        robot, world, before = {}, [], ""
-        for _, arr in data.iterrows():
-            name, a0, a1, b0, b1, c0, c1 = arr
-            if name in unaids.world:
-                if name != before:
-                    world, before = [], name
-                if isinstance(c0, (int, float)) and float(c0) > 0:
-                    world = self.num(a0, b0, c0)
-                continue
-            if not name in robot:
-                robot[name] = world
-            for e in [[a1, b1, c1], [a0, b0, c0]]:
-                a, b, c = e
-                if isinstance(a, (int, float)) and float(a) > 0:
-                    if isinstance(c, (int, float)) and float(c) > 0:
-                        a, b, c = [float(str(x).replace(">", "")) for x in e]
-                        robot[name] = self.num(a, b, c)
+        name = data.iloc[:, 0].reset_index(drop=True)
+        cell = data.iloc[:, 1:].to_numpy(object)
+        good = np.vectorize(lambda i: isinstance(i, (int, float)), otypes=[bool])
+        good = good(cell)
+        num = np.where(good, cell, np.nan).astype(float)
+        good = good & (num > 0)
+        size = pd.Series(cell[:, 2:4].ravel()).astype(str).str.replace(">", "")
+        size = pd.to_numeric(size, errors="coerce").to_numpy().reshape(-1, 2)
+        reg, block = self.block(name)
+
+        last = np.where(reg & good[:, 4], np.arange(len(name)), np.nan)
+        last = pd.Series(last).groupby(block).ffill().to_numpy()
+        first = ~reg & ~name.duplicated().to_numpy() & ~np.isnan(last)
+        world = cell[last[first].astype(int)][:, [0, 2, 4]]
+        world = pd.DataFrame(world, index=name[first], columns=target)
+
+        pick = np.where((good[:, 0] & good[:, 4])[:, None], [0, 2, 4], [1, 3, 5])
+        keep = ~reg & ((good[:, 0] & good[:, 4]) | (good[:, 1] & good[:, 5]))
+        row = np.arange(len(name))[:, None]
+        value = num[row, pick]
+        value[:, 1] = size[np.arange(len(name)), pick[:, 1] - 2]
+        value = pd.DataFrame(value, index=name, columns=target).astype(object)[keep]
+        value = pd.concat([world, value[~value.index.duplicated(keep="last")]])
+        robot = value[~value.index.duplicated(keep="last")]
 
         data = unaids.data[1].iloc[6:, [2, 48]]
-        country, after, hunt = [], "", {}
-        for _, arr in data.iterrows():
-            name, n0 = arr
-            n0 = unaids.num(n0)
-            if name in unaids.world:
-                if name != before:
-                    world, before = [], name
-                world.append(n0)
-                continue
-            else:
-                if name != after:
-                    country, after = [], name
-                if n0:
-                    country.append(n0)
-                hunt[name] = [world, country]
-
-        for i in matrix:
-            if i in robot:
-                matrix[i].update(robot[i])
-            if i in hunt:
-                a, b = hunt[i]
-                value = b[-3:] if len(b) > 1 else a[-3:]
-                value = (value[-1] / value[0]) ** (1 / (len(value) - 1)) - 1
-                matrix[i]["New infection"] = round(value, 5)
-        return matrix
+        name = data.iloc[:, 0].reset_index(drop=True)
+        value, miss, _ = unaids.num_col(data.iloc[:, 1])
+        value = np.where(miss, 0, value)
+        reg, block = self.block(name)
+        code, world = pd.factorize(block[reg])
+        rate = unaids.rate(unaids.rate_pad(value[reg], code), 3)
+        world = pd.Series(rate["cagr"], index=world)
+        data = pd.Series(block[~reg], index=name[~reg])
+        data = data[~data.index.duplicated(keep="last")]
+        hunt = pd.Series(world.reindex(data.to_numpy()).to_numpy(), index=data.index)
+        keep = ~reg & (value != 0)
+        code, local = pd.factorize(name[keep])
+        rate = unaids.rate(unaids.rate_pad(value[keep], code), 3)
+        local = local[rate["window"] > 1]
+        hunt[local] = rate["cagr"][rate["window"] > 1]
+        grow = [round(i, 5) if np.isfinite(i) else np.nan for i in hunt.tolist()]
+        hunt = pd.DataFrame({"New infection": grow}, index=hunt.index, dtype=object)
+        data = robot.join(hunt, how="outer")
+        return self.key(data.index, data, "unaids", True)
 
-    def num(self, *number):
-        sets, target = {}, ["First", "Second", "Third"]
-        for i, e in enumerate(number):
-            sets[f"{target[i]} 95 target"] = e
-        return sets
+    def block(self, name):
+        reg = name.isin(unaids.region).to_numpy()
+        before = name.where(reg).ffill().shift()
+        block = (reg & (name != before).to_numpy()).cumsum()
+        return reg, block
+
+    def key(self, name, data, source, add=False):
+        import pandas as pd  # pip install pandas
+
+        name = country.ids(name, source, add)
+        data = pd.DataFrame(data, dtype=object).set_axis(name)[name >= 0]
+        return data[~data.index.duplicated(keep="last")]
+
+    def name_map(self, data):
+        data = list(data)
+        sets = {i: self.name(i) for i in set(data)}
+        return [sets[i] for i in data]
 
     def name(self, name):
-        name = name.split(",")[0].split("(")[0].strip(" ").replace("'s ", " ")
-        data = [
-            ["Cape Verde", "Cabo Verde"],
-            ["Cote dIvoire", "Cote d'Ivoire", "Côte d'Ivoire"],
-            ["Czech Republic", "Czechia"],
-            ["Dominican Republic", "Dominica"],
-            ["Lao People Democratic Republic", "Lao PDR"],
-            ["Slovakia", "Slovak Republic"],
-        ]
-        for e in data:
-            if name in e:
-                name = e[0]
-        return name
+        return name.split(",")[0].split("(")[0].strip(" ").replace("'s ", " ")
 
 
 forest = Forest()
+
+if __name__ == "__main__":
+    forest.run()
@@ -0,0 +1,77 @@
+import argparse, time
+from probe import probe
+from render import render
+
+
+def run(stage, args=None):
+    if stage == "serve":
+        from serve import serve
+
+        return serve.run(args.host, args.port)
+    if stage == "vintage":
+        from vintage import vintage
+
+        return print(vintage.run(args.path, args.jobs).head(20).to_string())
+    if stage in ["forest", "sweep"]:
+        from forest import forest
+
+        if stage == "sweep":
+            return print(forest.sweep().head(20).to_string())
+        return forest.run()
+    from predict import predict
+
+    area = ["target", "global", "world"]
+    if stage == "all":
+        return predict.run_area()
+    return predict.run_area(area.index(stage), every=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UNAIDS projection pipeline")
+    parser.add_argument("--time", action="store_true", help="print stage timings")
+    parser.add_argument("--trace", help="write spans to .jsonl or Chrome .json")
+    parser.add_argument("--memory", action="store_true", help="trace peak memory")
+    parser.add_argument("--format", default="svg", choices=["svg", "png", "pdf"])
+    parser.add_argument("--workers", type=int, default=0, help="render processes")
+    parser.add_argument("--draws", type=int, default=0, help="bootstrap band draws")
+    total = ["bottom", "top", "reconcile"]
+    parser.add_argument("--total", default="bottom", choices=total)
+    parser.add_argument("--country", action="store_true", help="sum from country fits")
+    stage = parser.add_subparsers(dest="stage", required=True)
+    stage.add_parser("target", help="95-95-95 target lines (fig__target.svg)")
+    stage.add_parser("global", help="regional and global lines (fig__global.svg)")
+    stage.add_parser("world", help="growth map and bar chart (fig__map/bar.svg)")
+    stage.add_parser("forest", help="random forest importance (output.svg)")
+    stage.add_parser("sweep", help="rank feature subsets by OOB score (sweep.txt)")
+    stage.add_parser("all", help="every predict stage, then forest")
+    vintage = stage.add_parser("vintage", help="fit and diff workbook releases")
+    vintage.add_argument("path", nargs="?", default="", help="workbook directory")
+    vintage.add_argument("--jobs", type=int, default=0, help="ingest processes")
+    serve = stage.add_parser("serve", help="answer projection queries over HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8095)
+    args = parser.parse_args(argv)
+    if args.trace:
+        probe.start(args.trace, args.memory)
+    render.format, render.workers = args.format, args.workers
+    if args.draws or args.total != "bottom" or args.country:
+        from predict import predict
+
+        predict.draws, predict.hier = args.draws, args.total
+        predict.level = 2 if args.country else 1
+
+    with render.batch():
+        for i in ["all", "forest"] if args.stage == "all" else [args.stage]:
+            start = time.perf_counter()
+            with probe.span(f"main.{i}"):
+                run(i, args)
+            if args.time:
+                print(f"{i}: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+    if args.time:
+        print(f"render: {time.perf_counter() - start:.2f}s")
+    return
+
+
+if __name__ == "__main__":
+    main()
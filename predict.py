@@ -1,13 +1,10 @@
-import os
+import bisect, os
 import numpy as np
-import pandas as pd  # pip install pandas openpyxl
-import geopandas as gpd  # pip install geopandas matplotlib
-import matplotlib.pyplot as plt  # pip install matplotlib
-import matplotlib.colors as mcolors
-from matplotlib.colors import LinearSegmentedColormap
-from matplotlib.ticker import FuncFormatter
-from matplotlib.cm import ScalarMappable
+from country import country
+from probe import probe
+from render import render
 from rheast import rheast
+from store import store
 from unaids import unaids
 
 
@@ -20,24 +17,39 @@ class Predict:
         ]
         self.vlim = {"vmin": -10, "vmax": 10}
         self.cmap = ["#1677ff", "#5dfeb7", "#fff3d9", "#ff8f1f", "#f93a4a"]
-        self.cmap = LinearSegmentedColormap.from_list("custom_cmap", self.cmap, N=256)
-        plt.rcParams["font.sans-serif"] = "Times New Roman"
-        self.run_area()
+        self.model, self.shape, self.simplify = {}, {}, 0.1
+        self.draws, self.band, self.boot = 0, {}, []
+        self.hier, self.level, self.sums = "bottom", 1, {}
         return
 
-    def run_area(self, index=0):
+    def plot(self):
+        import matplotlib  # pip install matplotlib
+        from matplotlib.colors import LinearSegmentedColormap
+
+        matplotlib.rcParams["font.sans-serif"] = "Times New Roman"
+        if isinstance(self.cmap, list):
+            cmap = LinearSegmentedColormap.from_list
+            self.cmap = cmap("custom_cmap", self.cmap, N=256)
+        return matplotlib
+
+    def run_area(self, index=0, every=True):
         run = {"0": self.run_target, "1": self.run_global, "2": self.run_world}
         if not str(index) in run:
             return False
-        matrix, ctrl = run[str(index)]()
-        image = self.all(matrix)
-        if index > 1:
-            data = self.growth(image)
-            self.map(data)
-            self.bar(data)
-        else:
-            self.line(image, ctrl)
-        return self.run_area(index + 1)
+        with render.batch():
+            with probe.span(f"predict.{run[str(index)].__name__}"):
+                matrix, ctrl = run[str(index)]()
+                with probe.span("predict.all"):
+                    image = self.all(matrix)
+                if index > 1:
+                    with probe.span("predict.growth"):
+                        data = self.growth(image)
+                    self.save(data)
+                    self.map(data)
+                    self.bar(data)
+                else:
+                    self.line(image, ctrl)
+            return self.run_area(index + 1) if every else True
 
     def run_world(self):
         matrix = set(unaids.sheet(1, every=True)["Unnamed: 2"])
@@ -64,31 +76,40 @@ class Predict:
         return matrix, ctrl
 
     def growth(self, matrix):
-        data = []
-        for (_, value), name in matrix:
-            number, growth = value, False
-            for i in range(len(value)):
-                if len(set(value[-(i + 1) :])) > 2:
-                    number = value[-(i + 1) :]
-                    break
-            if len(number) < 1 or name in unaids.world:
-                continue
-            start, end, year = number[0], number[-1], len(number) - 1
-            if start and end and year:
-                if abs(end - start) / (1 / year) < 100:
-                    continue
-                growth = (end / start) ** (1 / year) - 1
-            if growth and not np.isnan(growth):
-                data.append([name, float(f"{growth*100:.3f}")])
+        matrix = [[v, name] for (_, v), name in matrix if not name in unaids.region]
+        rate = unaids.rate(unaids.rate_pad([v for v, _ in matrix]))
+        start, end, year = rate["start"], rate["end"], rate["year"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            keep = (rate["window"] > 0) & (start != 0) & (end != 0) & (year > 0)
+            keep = keep & ~(np.abs(end - start) / (1 / year) < 100)
+        growth = np.where(keep, rate["cagr"], np.nan).tolist()
+        data = [[n, float(f"{g*100:.3f}")] for (_, n), g in zip(matrix, growth)]
+        data = [i for i, g in zip(data, growth) if g and not np.isnan(g)]
         data = sorted(data, key=lambda i: (i[1], i[0]))
         return data
 
     def map(self, data):
+        import pandas as pd  # pip install pandas openpyxl
+
         countries, values = zip(*data)
         df = pd.DataFrame({"name": countries, "value": values})
+        with probe.span("predict.map.read"):
+            world = self.geometry(self.simplify)
+        df["id"] = country.ids(df["name"], "unaids")
+        df = df[df["id"] >= 0].drop_duplicates("id", keep="last")
+        world = world.merge(df, how="left", on="id")
+        return render.add("predict", "fig_map", "fig__map", world)
+
+    def fig_map(self, world):
+        from matplotlib.cm import ScalarMappable
+        from matplotlib.colors import Normalize
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import FuncFormatter
 
-        fig, ax = plt.subplots(1, 1, figsize=(12, 5))
-        sm = ScalarMappable(cmap=self.cmap, norm=plt.Normalize(**self.vlim))
+        self.plot()
+        fig = Figure(figsize=(12, 5))
+        ax = fig.subplots(1, 1)
+        sm = ScalarMappable(cmap=self.cmap, norm=Normalize(**self.vlim))
         sm.set_array([])
         axp = ax.get_position()
         cbar = fig.add_axes([axp.x1 + 0.02, axp.y0, 0.02, axp.height])
@@ -96,63 +117,100 @@ class Predict:
         cbar.set_label("Growth Rate")
         cbar.ax.yaxis.set_major_formatter(FuncFormatter(unaids.num_per))
 
-        sets = {"column": "value", "ax": ax, **self.vlim}
-        sets = {**sets, "cmap": self.cmap, "missing_kwds": {"color": "#d1d5dd"}}
-        world = os.path.join(rheast.file, "ne_110m_admin_0_countries.zip")
-        world = gpd.read_file(world)
-        world = world.merge(df, how="left", left_on="NAME", right_on="name")
-        world.boundary.plot(ax=ax, linewidth=1, color="black")
+        line = {"edgecolor": "black", "linewidth": 1}
+        sets = {"column": "value", "ax": ax, **self.vlim, **line}
+        sets = {**sets, "cmap": self.cmap, "missing_kwds": {"color": "#d1d5dd", **line}}
         world.plot(**sets)
+        return fig, {"bbox_inches": "tight"}
 
-        path = os.path.join(rheast.image, "fig__map.svg")
-        fig.savefig(path, bbox_inches="tight", format="svg")
-        return
+    def geometry(self, simplify=0):
+        import geopandas as gpd  # pip install geopandas
+
+        if simplify in self.shape:
+            return self.shape[simplify]
+        path = os.path.join(rheast.file, "ne_110m_admin_0_countries.zip")
+
+        def build():
+            data = gpd.read_file(path)[["NAME", "geometry"]]
+            if simplify:
+                data["geometry"] = data.simplify(simplify, preserve_topology=True)
+            return data
+
+        data = rheast.load(path, build, f"geometry_{simplify}")
+        data["id"] = country.ids(data["NAME"], "naturalearth")
+        self.shape[simplify] = data
+        return data
+
+    def save(self, data):
+        name, rate = zip(*data) if data else [[], []]
+        data = {"name": np.array(name, dtype=str), "rate": np.array(rate, dtype=float)}
+        store.put("growth", data, [unaids.xlsx], "predict.growth")
+        model = {a: b[0] for a, b in self.model.items() if b}
+        params = np.full((len(model), 3), np.nan)
+        for i, (_, p, _) in enumerate(model.values()):
+            params[i, : len(p)] = p
+        data = {"name": np.array(list(model), dtype=str), "a": params[:, 0]}
+        data = {**data, "b": params[:, 1], "k": params[:, 2]}
+        data["r2"] = np.array([i[0] for i in model.values()], dtype=float)
+        data["run"] = np.array([i[2].__name__ for i in model.values()], dtype=str)
+        return store.put("model", data, [unaids.xlsx], "predict.all")
 
     def bar(self, data):
+        return render.add("predict", "fig_bar", "fig__bar", data)
+
+    def fig_bar(self, data):
+        import matplotlib.colors as mcolors
+        from matplotlib.figure import Figure
+
+        self.plot()
         countries, values = zip(*data[-65:][::-1])
         norm = mcolors.Normalize(**self.vlim)
         cmap = [self.cmap(norm(v)) for v in values]
 
-        plt.figure(figsize=(15, 5))
-        plt.grid(True, color=self.border, linestyle="--")
-        plt.bar(countries, values, color=cmap, zorder=4)
-        ax = plt.gca()
+        fig = Figure(figsize=(15, 5))
+        ax = fig.subplots()
+        ax.grid(True, color=self.border, linestyle="--")
+        ax.bar(countries, values, color=cmap, zorder=4)
         ax.set_yticks(ax.get_yticks())
         [ax.spines[e].set_color(self.border) for e in ["top", "right"]]
         [unaids.num_lim(i, 0) for i in ax.get_yticks()]
-        plt.ylabel("Growth Rate")
-        plt.xticks(rotation=35, ha="right")
-        plt.xlim(-0.5, len(countries) - 0.5)
-        plt.tight_layout()
-        plt.subplots_adjust()
-
-        path = os.path.join(rheast.image, "fig__bar.txt")
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(str(data))
-        path = os.path.join(rheast.image, "fig__bar.svg")
-        plt.savefig(path, bbox_inches="tight", format="svg")
-        return
+        ax.set_ylabel("Growth Rate")
+        [i.set(rotation=35, ha="right") for i in ax.get_xticklabels()]
+        ax.set_xlim(-0.5, len(countries) - 0.5)
+        fig.tight_layout()
+        fig.subplots_adjust()
+        return fig, {"bbox_inches": "tight"}
 
     def line(self, image, ctrl={}):
+        image = [{**i, "data": list(i["data"])} for i in image]
+        return render.add("predict", "fig_line", f"fig_{ctrl['path']}", image, ctrl)
+
+    def fig_line(self, image, ctrl):
+        from matplotlib.figure import Figure
+
+        self.plot()
         ax, axes = max([i["ax"] for i in image]), []
         fig = [(15, 5), (15, 11), (15, 17)][ax // 2]
-        fig = plt.figure(figsize=fig)
+        fig = Figure(figsize=fig)
         for i in range(ax + 1):
             i = int(f"{[11,12,22,22,32,32][ax]}{i+1}")
             axes.append(fig.add_subplot(i))
-        self.line_draw(image, axes, ctrl)
+        with probe.span("predict.line_draw", image=len(image)):
+            self.line_draw(image, axes, ctrl)
         self.line_grid(axes, ctrl)
-        path = os.path.join(rheast.image, f"fig_{ctrl['path']}.svg")
-        fig.savefig(path, bbox_inches="tight", format="svg")
-        return
+        return fig, {"bbox_inches": "tight"}
 
     def line_draw(self, image, axes, ctrl):
-        occupy = ctrl.get("oc", {})
+        occupy, window = ctrl.get("oc", {}), ctrl.get("ox", 0)
         for img in image:
             ax, sets = axes[img["ax"]], {"zorder": 4}
             data = list(img["data"])
             if len(data) == 0:
                 continue
+            if "band" in img:
+                sets = {"color": img["color"], "alpha": img["alpha"], "zorder": 3}
+                ax.fill_between(*data, linewidth=0, **sets)
+                continue
             x, y = data
             for i in img:
                 if i in ["color", "alpha", "s"]:
@@ -165,16 +223,27 @@ class Predict:
             if not "space" in img:
                 continue
             for a, b in zip(x, y):
-                o, j = f"{img['ax']}_{a:.0f}", img.get("range", 0.01)
-                occupy[o] = occupy.get(o, [])
+                o, j = (img["ax"], int(round(a))), img.get("range", 0.01)
                 sets = {"zorder": 5, "ha": "center", "textcoords": "offset points"}
                 sets = {**sets, "va": "bottom", "xytext": (1, 0), "fontsize": 9}
-                if any(i * (1 - j) < b < i * (1 + j) for i in occupy[o]):
+                if self.line_hit(occupy, o, b, j, window):
                     continue
                 ax.annotate(unaids.num_lim(b), (a, b), **sets)
-                occupy[o].append(b)
+                if b == b:
+                    bisect.insort(occupy.setdefault(o, []), b)
         return
 
+    def line_hit(self, occupy, key, y, j, window=0):
+        if not y > 0:
+            return False
+        lo, hi = y / (1 + j), y / (1 - j) if j < 1 else np.inf
+        for i in range(key[1] - window, key[1] + window + 1):
+            data = occupy.get((key[0], i), [])
+            n = bisect.bisect_right(data, lo)
+            if n < len(data) and data[n] < hi:
+                return True
+        return False
+
     def line_grid(self, axes, ctrl):
         for i, ax in enumerate(axes):
             ax.grid(True, color=self.border, linestyle="--")
@@ -192,27 +261,72 @@ class Predict:
         return
 
     def all(self, matrix):
-        image, robot = [], []
+        image, robot, self.boot = [], [], []
         for i, (name, ax, info) in enumerate(matrix):
             sets = {"name": name, "ax": ax, "range": info.get("range", 0.025)}
-            data = self.all_data(sets, info)
+            data = self.all_data(sets, info, self.draws > 0)
+            data, bound = data[:2], data[2:] or None
             if len(matrix) > len(self.color):
                 if len(data) and len(data[0]):
                     image.append([data, name])
+                    self.boot.append(bound)
                 continue
             matrix[i] = data
             sets, data, image = self.all_before(i, sets, info, data, matrix, image)
             image, robot = self.all_after(i, sets, info, data, matrix, image, robot)
+            if self.draws:
+                self.boot[-1].append(None if info.get("rule") == 95 and i else bound)
+        if len(matrix) > len(self.color):
+            keep = [len(data[0]) > 1 for data, _ in image]
+            data = [e for e, k in zip(image, keep) if k]
+            model = rheast.fit_many([data for data, _ in data])
+            self.model = {name: e for (_, name), e in zip(data, model)}
+            bound = [e for e, k in zip(self.boot, keep) if k]
+            data = zip(data, model, bound)
+            self.boot = [[{"name": n}, a, m, b] for (a, n), m, b in data]
+        if self.draws:
+            band = self.all_band(self.boot)
+            image += [] if len(matrix) > len(self.color) else band
         return image
 
-    def all_data(self, sets, info):
-        data = unaids.sheet_get(**{**sets, **info})
+    def all_data(self, sets, info, bound=False):
+        data = unaids.sheet_get(**{**sets, **info, "bound": bound})
         for i in [(1, 27), (3, 78)]:
             if len(data) > 1 and len(set(data[1])) > 1:
                 break
-            data = unaids.sheet_get(**{**sets, **info, "page": i})
+            data = unaids.sheet_get(**{**sets, **info, "page": i, "bound": bound})
         return data
 
+    def all_total(self, model):
+        tree = unaids.tree(self.level)
+        if self.level > 1:
+            data = [self.all_data({"name": i}, {}) for i in tree["leaf"]]
+            data = [[a, b] for a, b in zip(tree["leaf"], data) if len(b[0]) > 1]
+            with probe.span("predict.all_total", series=len(data)):
+                fit = rheast.fit_many([b for _, b in data])
+            model = {**model, **{a: m for (a, _), m in zip(data, fit)}}
+        model = {a: b for a, b in model.items() if b}
+        x, data, index = unaids.sheet_mat(model, space=0.25)
+        base = np.full((len(tree["node"]), len(x)), np.nan)
+        for i, name in enumerate(tree["node"]):
+            base[i] = data[index[name]] if name in index else base[i]
+        data = unaids.agg(tree, base, self.hier)
+        self.sums = dict(zip(tree["node"], data))
+        return x, data[:1]
+
+    def all_band(self, boot):
+        grid = np.linspace(*unaids.time, 149)
+        sets, data, model, bound = zip(*boot) if boot else [[]] * 4
+        with probe.span("predict.all_band", series=len(data), draws=self.draws):
+            band = rheast.boot(data, model, grid, self.draws, bound)
+        self.band = {a["name"]: [grid, *b] for a, b in zip(sets, band)}
+        image = []
+        for sets, data, (lo, hi) in zip(sets, data, band):
+            keep = grid >= data[0][-1]
+            img = {**sets, "alpha": 0.15, "band": True}
+            image.append({**img, "data": [grid[keep], lo[keep], hi[keep]]})
+        return image
+
     def all_before(self, i, sets, info, data, matrix, image):
         rule = info.get("rule")
         sets["color"] = info.get("color", self.color[i])
@@ -235,12 +349,16 @@ class Predict:
         time = (data[0][0], data[0][-1])
         model = rheast.fit_all(data)
         image += unaids.sheet_img(data, model, sets)
+        if self.draws:
+            self.boot.append([sets, data, model])
+        if rule == "sum":
+            robot.append(["Global" if i == 0 else sets["name"], model])
         if rule == "sum" and i > 0:
             sets = {"ax": 0, "color": "#4f5eff"}
-            robot.append(unaids.sheet_num(model, space=0.25, **sets))
         if rule == "sum" and i == len(matrix) - 1:
             sets = {**sets, "name": info["txt"]}
-            data = unaids.sheet_sum(robot, time[1] + 0.5, sets)
+            data = self.all_total(dict(robot))
+            data = unaids.sheet_sum(data, time[1] + 0.5, sets)
             line = list(data[-1]["data"])
             data[-1]["data"] = unaids.sheet_zip(line, lambda x: x >= time[1])
             image = data + image
@@ -256,3 +374,6 @@ class Predict:
 
 
 predict = Predict()
+
+if __name__ == "__main__":
+    predict.run_area()
@@ -0,0 +1,121 @@
+import atexit, contextlib, json, os, threading, time
+
+
+class Probe:
+    def __init__(self) -> None:
+        self.path, self.memory, self.on = "", False, False
+        self.local, self.event, self.count = threading.local(), [], {}
+        self.null = contextlib.nullcontext()
+        self.zero = time.perf_counter()
+        path = os.environ.get("RHEAST_TRACE", "")
+        if path:
+            self.start(path, os.environ.get("RHEAST_TRACE_MEMORY", "") == "1")
+        return
+
+    def start(self, path, memory=False):
+        import tracemalloc
+
+        if not self.on:
+            atexit.register(self.save)
+        self.path, self.memory, self.on = path, memory, True
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return
+
+    # each thread nests its own spans (serve builds in a worker thread)
+    @property
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @stack.setter
+    def stack(self, value):
+        self.local.stack = value
+
+    def span(self, name, **args):
+        return self.span_on(name, args) if self.on else self.null
+
+    @contextlib.contextmanager
+    def span_on(self, name, args):
+        sets = {"name": name, "args": args, "count": {}, "peak": 0, "pid": os.getpid()}
+        sets["tid"] = threading.get_native_id()
+        sets["parent"] = self.stack[-1]["name"] if self.stack else ""
+        sets["depth"], sets["ts"] = len(self.stack), time.perf_counter()
+        self.peak(), self.stack.append(sets)
+        try:
+            yield sets
+        finally:
+            self.peak()
+            self.stack.pop()
+            sets["dur"] = time.perf_counter() - sets["ts"]
+            if self.stack:
+                self.stack[-1]["peak"] = max(self.stack[-1]["peak"], sets["peak"])
+            self.event.append(sets)
+        return
+
+    def peak(self):
+        import tracemalloc
+
+        if self.memory and self.stack:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+        return
+
+    def add(self, name, n=1):
+        if not self.on:
+            return
+        self.count[name] = self.count.get(name, 0) + n
+        if self.stack:
+            count = self.stack[-1]["count"]
+            count[name] = count.get(name, 0) + n
+        return
+
+    # worker side: hand back what was recorded since the last take
+    def take(self):
+        data, self.event, self.count = [self.event, self.count], [], {}
+        return data
+
+    def merge(self, event, count):
+        depth = len(self.stack)
+        for i in event:
+            i["depth"] += depth
+            i["parent"] = i["parent"] or (self.stack[-1]["name"] if depth else "")
+        self.event += event
+        for a, b in count.items():
+            self.add(a, b)
+        return
+
+    def save(self, path=""):
+        path = path or self.path
+        if not path:
+            return
+        event = sorted(self.event, key=lambda i: i["ts"])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for i in event:
+                    i = {**i, "ts": i["ts"] - self.zero}
+                    f.write(json.dumps(i, default=str) + "\n")
+                f.write(json.dumps({"name": "total", "count": self.count}) + "\n")
+            else:
+                f.write(json.dumps({"traceEvents": self.chrome(event)}, default=str))
+        return
+
+    def chrome(self, event):
+        matrix, pid = [], os.getpid()
+        for i in event:
+            sets = {"name": i["name"], "ph": "X", "pid": i["pid"], "tid": i["tid"]}
+            sets["ts"] = (i["ts"] - self.zero) * 1e6
+            sets["dur"] = i["dur"] * 1e6
+            sets["args"] = {**i["args"], **i["count"]}
+            if self.memory:
+                sets["args"]["peak_bytes"] = i["peak"]
+            matrix.append(sets)
+        sets = {"name": "total", "ph": "C", "pid": pid, "tid": 0, "ts": 0}
+        matrix.append({**sets, "args": self.count})
+        return matrix
+
+
+probe = Probe()
@@ -0,0 +1,63 @@
+import contextlib, importlib, os
+from concurrent.futures import ProcessPoolExecutor
+from probe import probe
+from rheast import rheast
+
+
+class Render:
+    def __init__(self) -> None:
+        self.format, self.workers, self.hold, self.queue = "svg", 0, 0, []
+        return
+
+    @contextlib.contextmanager
+    def batch(self):
+        self.hold += 1
+        try:
+            yield self
+        finally:
+            self.hold -= 1
+        self.flush()
+
+    def add(self, owner, name, path, *args):
+        self.queue.append([owner, name, path, args])
+        return self.flush()
+
+    def flush(self):
+        if self.hold or not self.queue:
+            return []
+        data, self.queue = self.queue, []
+        workers = min(self.workers or os.cpu_count() or 1, len(data))
+        with probe.span("render.run", figure=len(data), workers=workers):
+            if workers > 1:
+                sets = {"initializer": self.init, "initargs": (probe.on,)}
+                with ProcessPoolExecutor(workers, **sets) as pool:
+                    data = list(pool.map(self.task, data))
+                for _, event in data:
+                    probe.merge(*event)
+                return [path for path, _ in data]
+            return [self.draw(i) for i in data]
+
+    # workers record spans but never write the trace; the parent merges them
+    def init(self, on=False):
+        import matplotlib  # pip install matplotlib
+
+        matplotlib.use("Agg")
+        probe.on, probe.path, probe.memory = on, "", False
+        probe.stack, probe.event, probe.count = [], [], {}
+        return
+
+    def task(self, spec):
+        path = self.draw(spec)
+        return path, probe.take()
+
+    def draw(self, spec):
+        owner, name, path, args = spec
+        with probe.span("render.draw", figure=path):
+            owner = getattr(importlib.import_module(owner), owner)
+            fig, sets = getattr(owner, name)(*args)
+            path = os.path.join(rheast.image, f"{path}.{self.format}")
+            fig.savefig(path, format=self.format, **sets)
+        return path
+
+
+render = Render()
@@ -1,5 +1,7 @@
-import atexit, os, shutil
+import atexit, hashlib, json, os, pickle
+from collections import OrderedDict
 import numpy as np
+from probe import probe
 
 
 class RHEast:
@@ -7,13 +9,22 @@ class RHEast:
         self.font = "Times New Roman"
         self.year = 2025
         self.path = os.path.dirname(os.path.abspath(__file__))
-        self.file = os.path.join(self.path, "file")
-        self.image = os.path.join(self.path, "image")
+        self.root = os.environ.get("RHEAST_DATA", self.path)
+        self.file = os.path.join(self.root, "file")
+        self.image = os.path.join(self.root, "image")
+        self.cache = os.path.join(self.root, "cache")
+        self.memo, self.size, self.dirty = None, 1 << 16, False
+        # fit algorithm version, hashed into every memo key: bump it whenever a
+        # fit_* change can alter results so fit.pkl stops serving stale fits
+        self.version = 3
+        self.count = {"hit": 0, "miss": 0}
         os.makedirs(self.image, exist_ok=True)
-        pycache = os.path.join(self.path, "__pycache__")
-        atexit.register(lambda: shutil.rmtree(pycache, ignore_errors=True))
+        atexit.register(self.memo_save)
         return
 
+    def __getstate__(self):
+        return {**self.__dict__, "memo": OrderedDict(), "dirty": False}
+
     # y=α*(x-κ)+β Linear
     def lin(self, x, a, b, k=0):
         return a * (x - k) + b
@@ -28,15 +39,48 @@ class RHEast:
 
     # y=α/(1+e^(β*(x-κ))) Sigmoid
     def sig(self, x, a, b, k=0):
-        return a / (1 + np.exp(-b * (x - k)))
+        z = b * (np.asarray(x) - k)
+        e = np.exp(-np.abs(z))
+        return a * np.where(z >= 0, 1 / (1 + e), e / (1 + e))
 
-    def fit(self, data, run):
-        from scipy.optimize import curve_fit  # pip install scipy
-        from sklearn.metrics import r2_score  # pip install scikit-learn
-        import warnings
+    # ∂y/∂(α, β, κ) of each model above
+    def jac(self, x, run, a, b, k=0):
+        x = np.asarray(x, dtype=np.float64)
+        ones = np.ones_like(x)
+        if run == self.lin:
+            data = [x - k, ones, -a * ones]
+        elif run == self.log:
+            data = [np.log(x - k), ones, -a / (x - k)]
+        elif run == self.exp:
+            e = np.exp(b * (x - k))
+            data = [e, a * (x - k) * e, -a * b * e]
+        else:
+            s = self.sig(x, 1, b, k)
+            data = [s, a * s * (1 - s) * (x - k), -a * b * s * (1 - s)]
+        return np.stack(np.broadcast_arrays(*data), axis=-1)
 
-        x, y = [np.array(i) for i in data]
-        year = [2000, 2000 * 2 - self.year, self.year]
+    def fit(self, data, run, check=False, year=0):
+        x, y = [np.array(i, dtype=np.float64) for i in data]
+        sets = self.fit_set(x, run, year)
+        key = self.memo_key(x, y, run, sets, year=year)
+        if not check and key in self.memo_get():
+            return self.memo_hit(key)
+        if run == self.lin:
+            params = self.fit_lin(x, y, sets)
+        elif run == self.log:
+            params = self.fit_log(x, y, sets, year)
+        else:
+            params = self.fit_jac(x, y, run, sets)
+        r2 = self.r2(y, run(x, *params))
+        if check:
+            self.fit_check(data, run, r2, params, year)
+        probe.add(f"fit.{run.__name__}")
+        self.memo_put(key, (r2, params))
+        return r2, params
+
+    def fit_set(self, x, run, year=0):
+        year = year or self.year
+        year = [2000, 2000 * 2 - year, year]
         p0, b0, b1 = [0] * 3, [-np.inf] * 3, [np.inf] * 3
         if run == self.sig:
             b0, b1 = [0, -1, -np.inf], [1, 1, np.inf]
@@ -44,28 +88,437 @@ class RHEast:
             p0, b0, b1 = p0[0:2], b0[0:2], b1[0:2]
         else:
             p0[-1], b0[-1], b1[-1] = year
-        sets = {"p0": p0, "bounds": (b0, b1), "maxfev": int(1e5)}
-        # print(sets)
+        return {"p0": p0, "bounds": (b0, b1), "maxfev": int(1e5)}
+
+    def fit_lin(self, x, y, sets, k=None):
+        k = sets["p0"][2:] if k is None else [k]
+        u = x - k[0] if k else x
+        a, b = np.linalg.lstsq(np.stack([u, np.ones(len(u))], 1), y, rcond=None)[0]
+        return np.array([a, b, *k])
+
+    def fit_log(self, x, y, sets, year=0):
+        from scipy.optimize import minimize_scalar  # pip install scipy
+
+        b0, b1 = [i[2:] for i in sets["bounds"]]
+        if not b0:
+            return self.fit_lin(np.log(x), y, sets, 0)[:2]
+        lo, hi = b0[0], min(b1[0], x.min() - 1e-6)
+        if hi <= lo:
+            return self.fit_ref([x, y], self.log, year)[1]
+        grid = np.linspace(lo, hi, 64)
+        i = self.fit_log_sse(x, y, grid).argmin()
+        span = grid[max(i - 1, 0)], grid[min(i + 1, len(grid) - 1)]
+        cost = lambda k: self.fit_log_sse(x, y, k)[0]
+        k = minimize_scalar(cost, bounds=span, method="bounded").x
+        a, b, _ = self.fit_lin(np.log(x - k), y, sets, 0)
+        return np.array([a, b, k])
+
+    # residual sum of squares of the best α, β for each fixed κ
+    def fit_log_sse(self, x, y, k):
+        u = np.log(x[None, :] - np.reshape(k, (-1, 1)))
+        u, v = u - u.mean(1, keepdims=True), y - y.mean()
+        return v @ v - (u @ v) ** 2 / (u * u).sum(1)
+
+    def fit_jac(self, x, y, run, sets):
+        from scipy.optimize import curve_fit  # pip install scipy
+        import warnings
 
+        jac = lambda x, *p: self.jac(x, run, *p)[:, : len(p)]
+        p0 = self.fit_p0(x, y, run, sets)
+        # the data-driven start with the analytic jacobian; the plain default start
+        # only when that fails or lands below the R2 a model needs to be kept
+        # (flat series can send it into a poor minimum)
+        sets, model = {**sets, "full_output": True}, []
+        for i in [{"p0": p0, "jac": jac}, {}]:
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", category=RuntimeWarning)
+                try:
+                    params, _, info, _, _ = curve_fit(run, x, y, **{**sets, **i})
+                except RuntimeError:
+                    continue
+            probe.add("curve_fit.nfev", info["nfev"])
+            sse = np.nan_to_num(((run(x, *params) - y) ** 2).sum(), nan=np.inf)
+            model.append([sse, list(params)])
+            if self.r2(y, run(x, *params)) > 0.8:
+                break
+        if not model:
+            raise RuntimeError(f"{run.__name__} fit failed from both starts")
+        return np.array(min(model, key=lambda x: x[0])[1])
+
+    def fit_p0(self, x, y, run, sets):
+        b0, b1 = [np.array(i, dtype=np.float64) for i in sets["bounds"]]
+        p0, k = np.array(sets["p0"], dtype=np.float64), sets["p0"][2:]
+        if run == self.sig:
+            a = min(max(y.max() * 1.05, 1e-6), 1)
+            z = np.clip(y / a, 1e-6, 1 - 1e-6)
+            z = np.log(z / (1 - z))
+            if k:
+                b, c = np.polyfit(x, z, 1)
+                p0 = [a, b, -c / b if b else k[0]]
+            else:
+                p0 = [a, (x @ z) / (x @ x)]
+        elif run == self.exp and (y > 0).all():
+            b, c = np.polyfit(x - (k[0] if k else 0), np.log(y), 1)
+            p0 = [np.exp(c), b, *k]
+        span = np.where(np.isfinite(b1 - b0), (b1 - b0) * 1e-6, 0)
+        return np.clip(np.nan_to_num(p0), b0 + span, b1 - span)
+
+    def fit_ref(self, data, run, year=0):
+        from scipy.optimize import curve_fit  # pip install scipy
+        import warnings
+
+        x, y = [np.array(i) for i in data]
         with warnings.catch_warnings():
             warnings.filterwarnings("ignore", category=RuntimeWarning)
-            params, _ = curve_fit(run, x, y, **sets)
-            r2 = r2_score(y, run(x, *params))
-
+            sets = {**self.fit_set(x, run, year), "full_output": True}
+            params, _, info, _, _ = curve_fit(run, x, y, **sets)
+            r2 = self.r2(y, run(x, *params))
+        probe.add("curve_fit.nfev", info["nfev"])
         return r2, params
 
-    def fit_all(self, data, **_):
+    def fit_check(self, data, run, r2, params, year=0):
+        import warnings
+
+        x = np.array(data[0], dtype=np.float64)
+        try:
+            ref, model = self.fit_ref(data, run, year)
+        except (RuntimeError, ValueError):
+            return True
+        a, b = run(x, *params), run(x, *model)
+        if r2 < ref - 1e-6 or (abs(r2 - ref) < 1e-6 and not np.allclose(a, b, 1e-4)):
+            warnings.warn(f"{run.__name__} fit differs: R2 {r2:.6f} vs {ref:.6f}")
+        return r2 >= ref - 1e-6
+
+    def r2(self, y, f):
+        a, b = ((y - f) ** 2).sum(), ((y - np.mean(y)) ** 2).sum()
+        return 1 - a / b if b else float(a == 0)
+
+    def load(self, path, build, name=""):
+        import pandas as pd  # pip install pandas
+
+        name = os.path.join(self.cache, name or os.path.basename(path))
+        stat, meta = os.stat(path), {}
+        sets = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if os.path.exists(f"{name}.json") and os.path.exists(f"{name}.pkl"):
+            with open(f"{name}.json", "r", encoding="utf-8") as f:
+                meta = json.loads(f.read())
+        if meta.get("size") == sets["size"] and meta.get("mtime") == sets["mtime"]:
+            return pd.read_pickle(f"{name}.pkl")
+        sets["hash"] = self.hash(path)
+        if meta.get("size") == sets["size"] and meta.get("hash") == sets["hash"]:
+            data = pd.read_pickle(f"{name}.pkl")
+        else:
+            data = build()
+            os.makedirs(self.cache, exist_ok=True)
+            pd.to_pickle(data, f"{name}.tmp", compression=None)
+            os.replace(f"{name}.tmp", f"{name}.pkl")
+        with open(f"{name}.json", "w", encoding="utf-8") as f:
+            f.write(json.dumps(sets))
+        return data
+
+    def hash(self, path):
+        data = hashlib.sha256()
+        with open(path, "rb") as f:
+            for i in iter(lambda: f.read(1 << 20), b""):
+                data.update(i)
+        return data.hexdigest()
+
+    def fit_all(self, data, check=False, **_):
+        run = self.fit_run(data)
+        return self.fit_pick(run, [self.fit(data, i, check) for i in run])
+
+    def fit_run(self, data):
         run = [self.sig] if data[-1][-1] < 2 else [self.lin, self.log]
-        run = run[:1] if len(data[0]) < 3 else run
+        return run[:1] if len(data[0]) < 3 else run
+
+    def fit_pick(self, run, model):
         matrix = []
 
         for i in range(len(run)):
-            r2, params = self.fit(data, run[i])
+            if model[i] is None:
+                continue
+            r2, params = model[i]
             if run[i] == self.lin or r2 > 0.8:
                 matrix.append([r2, params, run[i]])
 
         return sorted(matrix, key=lambda x: x[0], reverse=True)
 
+    def fit_each(self, data, year=0):
+        return [self.fit_try(data, i, year) for i in self.fit_run(data)]
+
+    # one bad family (non-finite data, no convergence) drops out instead of the run
+    def fit_try(self, data, run, year=0):
+        try:
+            r2, params = self.fit(data, run, year=year)
+            if np.isfinite(r2) and np.isfinite(params).all():
+                return r2, params
+        except (RuntimeError, ValueError, np.linalg.LinAlgError):
+            pass
+        probe.add(f"fit.fail.{run.__name__}")
+        return None
+
+    def fit_many(self, data, workers=0, chunk=0, year=0):
+        from functools import partial
+
+        matrix = [None] * len(data)
+        sig = [i for i, e in enumerate(data) if e[-1][-1] < 2]
+        rest = [i for i, e in enumerate(data) if not e[-1][-1] < 2]
+        for i, e in zip(sig, self.fit_sig([data[i] for i in sig], year=year)):
+            matrix[i] = e
+        memo, keys = self.memo_get(), {i: self.memo_all(data[i], year) for i in rest}
+        todo = [i for i in rest if any(not e in memo for e in keys[i])]
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        if workers > 1:
+            run = partial(self.fit_each, year=year)
+            model = self.fit_pool(run, [data[i] for i in todo], workers, chunk)
+            for i, e in zip(todo, model):
+                for key, value in zip(keys[i], e):
+                    if value is not None:
+                        self.memo_put(key, value)
+                matrix[i] = self.fit_pick(self.fit_run(data[i]), e)
+        for i in rest:
+            e = self.fit_each(data[i], year) if matrix[i] is None else None
+            matrix[i] = self.fit_pick(self.fit_run(data[i]), e) if e else matrix[i]
+        return matrix
+
+    def fit_pool(self, run, data, workers=0, chunk=0):
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = min(workers or os.cpu_count() or 1, len(data))
+        if workers < 2:
+            return [run(i) for i in data]
+        chunk = chunk or -(-len(data) // (workers * 4))
+        with ProcessPoolExecutor(workers) as pool:
+            return list(pool.map(run, data, chunksize=chunk))
+
+    def fit_sig(self, data, steps=200, tol=1e-10, flag=False, year=0):
+        data = [[np.array(i, dtype=np.float64) for i in e] for e in data]
+        keys = [self.memo_key(x, y, self.sig, solver="lm", year=year) for x, y in data]
+        rest = [i for i, e in enumerate(keys) if not e in self.memo_get()]
+        with probe.span("rheast.fit_lm", series=len(rest)):
+            r2, params, done = self.fit_lm([data[i] for i in rest], steps, tol, year)
+        model, flags = {}, np.ones(len(data), dtype=bool)
+        for j, i in enumerate(rest):
+            model[i], flags[i] = (r2[j], params[j]), done[j]
+            if not done[j]:
+                model[i] = self.fit_try(data[i], self.sig, year) or model[i]
+            self.memo_put(keys[i], model[i])
+        matrix = []
+        for i, key in enumerate(keys):
+            e = model[i] if i in model else self.memo_hit(key)
+            matrix.append(self.fit_pick([self.sig], [e]))
+        return (matrix, flags) if flag else matrix
+
+    def fit_lm(self, data, steps=200, tol=1e-10, year=0):
+        n, t = len(data), max([len(i[0]) for i in data] or [0])
+        x, y, mask = np.zeros((n, t)), np.zeros((n, t)), np.zeros((n, t), bool)
+        p, lo, hi = np.zeros((5, n, 3)), np.zeros((n, 3)), np.zeros((n, 3))
+        free = np.zeros((n, 3), dtype=bool)
+        for i, (a, b) in enumerate(data):
+            x[i, : len(a)], y[i, : len(a)], mask[i, : len(a)] = a, b, True
+            sets = self.fit_set(a, self.sig, year)
+            m = len(sets["p0"])
+            lo[i, :m], hi[i, :m], free[i, :m] = *sets["bounds"], True
+            p[:, i, :m] = [e[:m] for e in self.fit_lm_p0(a, b, sets)]
+
+        # every start of every series runs in one batch; the lowest cost wins
+        k, data = len(p), [x, y, mask, lo, hi, free]
+        x, y, mask, lo, hi, free = [np.tile(i, (k, 1)) for i in data]
+        p = np.clip(p.reshape(-1, 3), lo, hi)
+        model = lambda p, j: self.sig(x[j], *p.T[:, :, None])
+        cost = lambda p, j: (mask[j] * (model(p, j) - y[j]) ** 2).sum(1)
+        lam, sse = np.full(len(p), 1e-3), cost(p, slice(None))
+        done, stop = np.zeros(len(p), bool), np.zeros(len(p), bool)
+        for _ in range(steps):
+            # only rows still running are solved, so the tail of slow series is cheap
+            j = np.flatnonzero(~stop)
+            if not len(j):
+                break
+            q, s, m = p[j], sse[j], mask[j]
+            jac = self.jac(x[j], self.sig, *q.T[:, :, None]) * m[:, :, None]
+            g = np.einsum("nti,nt->ni", jac, m * (model(q, j) - y[j]))
+            use = free[j] & ~(((q <= lo[j]) & (g > 0)) | ((q >= hi[j]) & (g < 0)))
+            jac, g = jac * use[:, None, :], g * use
+            a = np.einsum("nti,ntj->nij", jac, jac)
+            # KKT: the projected gradient is orthogonal to the residual, so an
+            # optimum pinned to a bound counts as converged
+            norm = np.sqrt(a.diagonal(0, 1, 2) * s[:, None])
+            kkt = (np.abs(g) <= np.sqrt(tol) * norm).all(1)
+            kkt |= s <= tol * (m * y[j] ** 2).sum(1)
+            a += np.einsum("ni,ij->nij", lam[j, None] * a.diagonal(0, 1, 2), np.eye(3))
+            a += np.einsum("ni,ij->nij", ~use, np.eye(3)) + 1e-12 * np.eye(3)
+            step = q - np.linalg.solve(a, g[:, :, None])[..., 0]
+            step = np.clip(step, lo[j], hi[j])
+            new = cost(step, j)
+            keep = new < s
+            move = np.abs(step - q).max(1) <= tol * (np.abs(q).max(1) + tol)
+            done[j] = kkt | (keep & ((s - new <= tol * s) | move))
+            p[j[keep]], sse[j] = step[keep], np.where(keep, new, s)
+            lam[j] = np.where(keep, lam[j] / 10, lam[j] * 10)
+            stop[j] = done[j] | (lam[j] > 1e10)
+            probe.add("fit.lm.iter")
+
+        pick = np.arange(n) + n * sse.reshape(k, n).argmin(0)
+        x, y, mask, p, sse, free = x[:n], y[:n], mask[:n], p[pick], sse[pick], free[:n]
+        mean = (mask * y).sum(1) / np.maximum(mask.sum(1), 1)
+        tot = (mask * (y - mean[:, None]) ** 2).sum(1)
+        r2 = np.where(tot > 0, 1 - sse / np.where(tot > 0, tot, 1), (sse == 0) * 1.0)
+        return r2, [p[i, : free[i].sum()] for i in range(n)], done[pick]
+
+    # LM starts: the data-driven one, the plain default, a saturated curve at
+    # the mean, a steep step at the largest jump and a tail reaching past the
+    # data; flat series otherwise stall with a and κ pinned to their bounds
+    def fit_lm_p0(self, x, y, sets):
+        j, s = np.abs(np.diff(y)).argmax(), np.sign(y[-1] - y[0]) or 1
+        flat = [y.mean(), 1, *sets["bounds"][0][2:]]
+        jump = [max(y[j : j + 2]), np.sign(y[j + 1] - y[j]), x[j : j + 2].mean()]
+        tail = [y.max(), s / 2, x[-1] + 1 if s < 0 else x[0] - 1]
+        return [self.fit_p0(x, y, self.sig, sets), sets["p0"], flat, jump, tail]
+
+    def boot(
+        self, data, model, grid, draws=200, bound=None, q=(2.5, 97.5), year=0, **sets
+    ):
+        seed, size = sets.get("seed", 0), sets.get("size", 1 << 14)
+        rng, grid = np.random.default_rng(seed), np.asarray(grid, dtype=np.float64)
+        band, sig = np.full((len(data), len(q), len(grid)), np.nan), []
+        for i, (data_i, model_i) in enumerate(zip(data, model)):
+            if not model_i:
+                continue
+            x, y = [np.array(e, dtype=np.float64) for e in data_i]
+            _, params, run = model_i[0]
+            bound_i = bound[i] if bound else None
+            y = self.boot_draw(rng, x, y, run(x, *params), draws, bound_i)
+            if run == self.sig:
+                sig.append([i, x, y])
+                continue
+            if run == self.lin:
+                params = self.boot_lin(x, y, year=year)
+            else:
+                params = self.boot_log(x, y, year)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                band[i] = np.percentile(run(grid, *params.T[:, :, None]), q, axis=0)
+        step = max(size // draws, 1)
+        for j in range(0, len(sig), step):
+            part = sig[j : j + step]
+            with probe.span("rheast.boot_lm", series=len(part), draws=draws):
+                sets = [[x, e] for _, x, y in part for e in y]
+                _, params, done = self.fit_lm(sets, year=year)
+                params = self.boot_fix(sets, params, done, year)
+            for n, (i, _, _) in enumerate(part):
+                p = np.array(params[n * draws : (n + 1) * draws])
+                band[i] = np.percentile(self.sig(grid, *p.T[:, :, None]), q, axis=0)
+        return band
+
+    # draws LM could not converge are refit with curve_fit over the process pool;
+    # nothing is memoised, the draws are thrown away once the band is cut
+    def boot_fix(self, sets, params, done, year=0):
+        from functools import partial
+
+        redo = np.flatnonzero(~np.asarray(done, dtype=bool))
+        probe.add("boot.refit", len(redo))
+        run = partial(self.boot_try, year=year)
+        for j, e in zip(redo, self.fit_pool(run, [sets[j] for j in redo])):
+            if e is None:
+                probe.add("fit.fail.sig")
+            else:
+                params[j] = e
+        return params
+
+    def boot_try(self, data, year=0):
+        x, y = data
+        try:
+            return self.fit_jac(x, y, self.sig, self.fit_set(x, self.sig, year))
+        except (RuntimeError, ValueError):
+            return None
+
+    def boot_draw(self, rng, x, y, f, draws, bound=None):
+        e = y - f
+        data = f + e[rng.integers(0, len(e), (draws, len(e)))]
+        if bound is not None:
+            low, high = [np.array(i, dtype=np.float64) for i in bound]
+            sd = (high - low) / (2 * 1.96)
+            keep = np.isfinite(sd) & (sd >= 0)
+            draw = y + rng.standard_normal((draws, len(y))) * np.where(keep, sd, 0)
+            data = np.where(keep, draw, data)
+        return data
+
+    def boot_lin(self, x, y, k=None, year=0):
+        k = self.fit_set(x, self.lin, year)["p0"][2:] if k is None else [k]
+        u = x - k[0] if k else x
+        a, b = np.linalg.lstsq(np.stack([u, np.ones(len(u))], 1), y.T)[0]
+        return np.stack([a, b, *[np.full(len(a), i) for i in k]], 1)
+
+    def boot_log(self, x, y, year=0):
+        sets = self.fit_set(x, self.log, year)
+        b0, b1 = [i[2:] for i in sets["bounds"]]
+        if not b0:
+            return self.boot_lin(np.log(x), y, 0)[:, :2]
+        lo, hi = b0[0], min(b1[0], x.min() - 1e-6)
+        if hi <= lo:
+            k = np.full(len(y), self.fit_log(x, y.mean(0), sets, year)[2])
+        else:
+            grid = np.linspace(lo, hi, 64)
+            k = grid[self.boot_log_sse(x, y, grid[None]).argmin(1)]
+            grid = k[:, None] + np.linspace(-1, 1, 33) * (grid[1] - grid[0])
+            grid = np.clip(grid, lo, hi)
+            k = grid[np.arange(len(k)), self.boot_log_sse(x, y, grid).argmin(1)]
+        u = np.log(x[None, :] - k[:, None])
+        uc, yc = u - u.mean(1, keepdims=True), y - y.mean(1, keepdims=True)
+        a = (uc * yc).sum(1) / (uc * uc).sum(1)
+        return np.stack([a, y.mean(1) - a * u.mean(1), k], 1)
+
+    # residual sum of squares per draw (rows of y) for each row of κ candidates
+    def boot_log_sse(self, x, y, k):
+        u = np.log(x[None, None, :] - k[:, :, None])
+        u, v = u - u.mean(2, keepdims=True), y - y.mean(1, keepdims=True)
+        uv = (u * v[:, None, :]).sum(2)
+        return (v * v).sum(1)[:, None] - uv**2 / (u * u).sum(2)
+
+    # solver keeps batched LM and per-series curve_fit results apart in fit.pkl
+    def memo_key(self, x, y, run, sets=None, solver="curve_fit", year=0):
+        sets, year = sets or self.fit_set(x, run, year), year or self.year
+        data = hashlib.sha1(np.asarray(x, dtype=np.float64).tobytes())
+        data.update(np.asarray(y, dtype=np.float64).tobytes())
+        data.update(f"v{self.version}|{run.__name__}|{solver}|{sets}|{year}".encode())
+        return data.hexdigest()
+
+    def memo_all(self, data, year=0):
+        x, y = [np.array(i, dtype=np.float64) for i in data]
+        return [self.memo_key(x, y, i, year=year) for i in self.fit_run(data)]
+
+    def memo_get(self):
+        if self.memo is None:
+            path, self.memo = os.path.join(self.cache, "fit.pkl"), OrderedDict()
+            try:
+                with open(path, "rb") as f:
+                    self.memo = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+        return self.memo
+
+    def memo_hit(self, key):
+        probe.add("fit.hit")
+        self.count["hit"] += 1
+        self.memo.move_to_end(key)
+        return self.memo[key]
+
+    def memo_put(self, key, value):
+        probe.add("fit.miss")
+        self.count["miss"] += 1
+        self.memo_get()[key], self.dirty = value, True
+        while len(self.memo) > self.size:
+            self.memo.popitem(last=False)
+
+    def memo_save(self):
+        if not self.dirty:
+            return
+        path = os.path.join(self.cache, "fit.pkl")
+        os.makedirs(self.cache, exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump(self.memo, f)
+        os.replace(f"{path}.tmp", path)
+        self.dirty = False
+
 
 rheast = RHEast()
 
@@ -0,0 +1,171 @@
+import asyncio, json, os, time, urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from probe import probe
+from unaids import unaids
+
+
+class Serve:
+    def __init__(self) -> None:
+        self.host, self.port, self.year = "127.0.0.1", 8095, 2030
+        self.page = [(1, 30), (3, 78), (3, 83), (3, 88)]
+        self.text = ["first", "second", "third"]
+        self.state, self.stamp, self.fail, self.task, self.next = [None] * 5
+        self.pool = None
+        self.route = ["/projection", "/growth", "/target", "/health"]
+        self.status = {200: "OK", 400: "Bad Request", 404: "Not Found"}
+        self.status = {**self.status, 405: "Method Not Allowed", 503: "Unavailable"}
+        self.status[500] = "Internal Server Error"
+        return
+
+    def run(self, host="", port=0):
+        return asyncio.run(self.main(host or self.host, port or self.port))
+
+    async def main(self, host, port):
+        self.pool = ThreadPoolExecutor(1)
+        await self.refresh(wait=True)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"serving {len(self.state['model'])} series on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def stat(self):
+        path = [unaids.xlsx]
+        stat = [os.stat(i) if os.path.exists(i) else None for i in path]
+        return tuple((i.st_size, i.st_mtime_ns) if i else None for i in stat)
+
+    async def refresh(self, wait=False):
+        stamp = self.stat()
+        if self.task and self.task.done():
+            if self.task.exception():
+                self.fail = self.next
+                print(f"refit failed: {self.task.exception()!r}")
+            self.task = None
+        if self.task is None and not stamp in (self.stamp, self.fail):
+            run = asyncio.get_running_loop().run_in_executor
+            self.task, self.next = run(self.pool, self.build, stamp), stamp
+        if wait and self.task:
+            await self.task
+        return self.task
+
+    def build(self, stamp):
+        from predict import predict
+
+        with probe.span("serve.build"):
+            unaids.open(unaids.xlsx)
+            image = predict.all(predict.run_world()[0])
+            model = {a: b[0] for a, b in predict.model.items() if b}
+            state = {"model": model, "growth": dict(predict.growth(image))}
+            state["target"], state["time"] = self.build_target(model), time.time()
+        self.state, self.stamp = state, stamp
+        return state
+
+    def build_target(self, name):
+        matrix = {}
+        for i in name:
+            data = [unaids.sheet_get(i, page) for page in self.page]
+            year = set.intersection(*[set(x.tolist()) for x, _ in data])
+            if not year:
+                continue
+            year = max(year)
+            data = np.array([y[x == year][-1] for x, y in data])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                data = data[1:] / data[:-1]
+            data = [float(e) if np.isfinite(e) else None for e in data]
+            matrix[i] = {"year": int(year), **dict(zip(self.text, data))}
+        return matrix
+
+    # every connection gets a JSON answer, even when a route blows up
+    async def handle(self, reader, writer):
+        try:
+            data = self.reply(*await self.answer(reader))
+        except ValueError as e:
+            data = self.reply(400, {"error": str(e)})
+        except Exception as e:
+            print(f"request failed: {e!r}")
+            data = self.reply(500, {"error": "internal error"})
+        try:
+            writer.write(data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        return
+
+    async def answer(self, reader):
+        line = (await reader.readline()).decode("latin-1").split()
+        while (await reader.readline()).strip():
+            pass
+        if len(line) < 2:
+            raise ValueError("malformed request line")
+        method, path = line[:2]
+        path = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(path.query))
+        await self.refresh()
+        if method != "GET":
+            return 405, {"error": f"{method} not allowed"}
+        if not path.path in self.route:
+            return 404, {"error": f"{path.path} not found"}
+        if self.state is None:
+            return 503, {"error": "models are loading"}
+        run = getattr(self, path.path[1:])
+        with probe.span(f"serve.{path.path[1:]}"):
+            return run(self.state, query)
+
+    def reply(self, status, data):
+        data = {**data, "stale": self.stat() != self.stamp}
+        body = json.dumps(data).encode()
+        head = f"HTTP/1.1 {status} {self.status[status]}\r\n"
+        head += "Content-Type: application/json\r\nConnection: close\r\n"
+        head += f"Content-Length: {len(body)}\r\n\r\n"
+        return head.encode() + body
+
+    def pick(self, data, query):
+        name = [i for i in query.get("name", "").split(",") if i]
+        miss = [i for i in name if not i in data]
+        if miss:
+            raise ValueError(f"unknown name: {', '.join(miss)}")
+        return name or list(data)
+
+    def projection(self, state, query):
+        model, year = state["model"], query.get("year", str(self.year))
+        year = [float(i) for i in year.split(",")]
+        data = {}
+        for i in self.pick(model, query):
+            r2, params, run = model[i]
+            value = run(np.array(year), *params)
+            value = [float(e) if np.isfinite(e) else None for e in value]
+            data[i] = {"model": run.__name__, "r2": float(r2)}
+            data[i]["value"] = dict(zip([f"{e:g}" for e in year], value))
+        return 200, {"data": data}
+
+    def growth(self, state, query):
+        rate = state["growth"]
+        data = [[i, rate[i]] for i in self.pick(rate, query)]
+        data = sorted(data, key=lambda x: x[1])
+        data = data[::-1] if query.get("order") == "desc" else data
+        data = data[: int(query["limit"])] if "limit" in query else data
+        return 200, {"data": dict(data)}
+
+    def target(self, state, query):
+        data, goal = state["target"], float(query.get("goal", 0.95))
+        data = {i: data[i] for i in self.pick(data, query)}
+        if "miss" in query:
+            if not query["miss"] in ["1", "2", "3"]:
+                raise ValueError("miss must be 1, 2 or 3")
+            text = self.text[int(query["miss"]) - 1]
+            data = {a: b for a, b in data.items() if b[text] is not None}
+            data = {a: {**b, "gap": goal - b[text]} for a, b in data.items()}
+            data = {a: b for a, b in data.items() if b["gap"] > 0}
+        return 200, {"data": data, "goal": goal}
+
+    def health(self, state, query):
+        data = {"series": len(state["model"]), "built": state["time"]}
+        return 200, {**data, "loading": self.task is not None}
+
+
+serve = Serve()
+
+if __name__ == "__main__":
+    serve.run()
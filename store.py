@@ -0,0 +1,92 @@
+import hashlib, json, os, time
+import numpy as np
+from probe import probe
+from rheast import rheast
+
+
+class Store:
+    def __init__(self) -> None:
+        self.path = os.path.join(rheast.cache, "store")
+        self.kind, self.stat = "biufU", {}
+        return
+
+    def put(self, name, data, deps=[], owner="", sets={}):
+        data = self.typed(data)
+        size = {len(i) for i in data.values()}
+        if len(size) > 1:
+            raise ValueError(f"{name}: columns differ in length {sorted(size)}")
+        meta = {"name": name, "owner": owner, "rows": size.pop() if size else 0}
+        meta["schema"] = {a: b.dtype.str for a, b in data.items()}
+        meta["digest"], meta["time"] = self.digest(data), time.time()
+        meta["deps"], meta["sets"] = self.deps(deps), json.loads(json.dumps(sets))
+        path = os.path.join(self.path, name)
+        os.makedirs(self.path, exist_ok=True)
+        with probe.span("store.put", artifact=name, rows=meta["rows"]):
+            with open(f"{path}.tmp", "wb") as f:
+                np.savez_compressed(f, **data)
+            os.replace(f"{path}.tmp", f"{path}.npz")
+            with open(f"{path}.json", "w", encoding="utf-8") as f:
+                f.write(json.dumps(meta, indent=1))
+        return meta
+
+    def get(self, name, schema={}):
+        meta = self.meta(name)
+        if meta is None:
+            raise FileNotFoundError(f"no artifact {name!r} in {self.path}")
+        path = os.path.join(self.path, f"{name}.npz")
+        with probe.span("store.get", artifact=name), np.load(path) as f:
+            data = {a: f[a] for a in meta["schema"]}
+        for a, b in {**meta["schema"], **schema}.items():
+            if not a in data or data[a].dtype.kind != np.dtype(b).kind:
+                kind = meta["schema"].get(a)
+                raise TypeError(f"{name}.{a}: expected {b}, stored {kind}")
+        return data
+
+    def meta(self, name):
+        path = os.path.join(self.path, f"{name}.json")
+        if not os.path.exists(path) or not os.path.exists(path[:-4] + "npz"):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.loads(f.read())
+
+    def fresh(self, name, deps=[], sets={}):
+        meta, sets = self.meta(name), json.loads(json.dumps(sets))
+        if meta is None or meta["sets"] != sets:
+            return False
+        return meta["deps"] == self.deps(deps)
+
+    def typed(self, data):
+        matrix = {}
+        for a, b in dict(data).items():
+            b = np.asarray(b)
+            if b.dtype.kind == "O":
+                kind = {type(i) for i in b.tolist()}
+                b = b.astype(str if kind <= {str} else np.float64)
+            if not b.dtype.kind in self.kind:
+                raise TypeError(f"column {a!r} has unsupported dtype {b.dtype}")
+            matrix[str(a)] = b
+        return matrix
+
+    def digest(self, data):
+        sha = hashlib.sha256()
+        for a in sorted(data):
+            sha.update(f"{a}|{data[a].dtype.str}|{data[a].shape}".encode())
+            sha.update(np.ascontiguousarray(data[a]).tobytes())
+        return sha.hexdigest()
+
+    # artifacts by digest, files by content hash (rehashed only when stat changes)
+    def deps(self, deps):
+        matrix = {}
+        for i in deps:
+            if os.path.isfile(i):
+                stat = os.stat(i)
+                key = (i, stat.st_size, stat.st_mtime_ns)
+                self.stat[key] = self.stat.get(key) or rheast.hash(i)
+                matrix[os.path.basename(i)] = self.stat[key]
+            else:
+                meta = self.meta(i) if os.sep not in i else None
+                matrix[i] = meta["digest"] if meta else ""
+        return matrix
+
+
+store = Store()
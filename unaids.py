@@ -1,14 +1,15 @@
 import os, re
 import numpy as np
-import pandas as pd  # pip install pandas openpyxl
+from probe import probe
+from rheast import rheast
 
 
 class UNAIDS:
     def __init__(self) -> None:
         self.path = os.path.dirname(os.path.abspath(__file__))
-        self.file = os.path.join(self.path, "file")
+        self.file = rheast.file
         self.xlsx = os.path.join(self.file, "HIV_estimates_from_1990-to-present.xlsx")
-        self.data = pd.read_excel(self.xlsx, sheet_name=[0, 1, 2, 3])
+        self.book, self.sheets = {}, None
         self.time = (2013, 2050)
         self.world = [
             *["Global", "Asia and the Pacific"],
@@ -17,6 +18,7 @@ class UNAIDS:
             *["Middle East and North Africa", "Western and central Africa"],
             *["Western and central Europe and North America"],
         ]
+        self.region = set(self.world)
         self.info = [
             *["Country", "Growth rate", "LGBT score"],
             *["Sex education", "Urban population", "Funding"],
@@ -25,7 +27,25 @@ class UNAIDS:
         ]
         return
 
+    def open(self, xlsx):
+        self.xlsx, self.book, self.sheets = xlsx, {}, None
+        return self
+
+    @property
+    def data(self):
+        if self.sheets is None:
+            with probe.span("unaids.load"):
+                self.sheets = rheast.load(self.xlsx, self.read)
+        return self.sheets
+
+    def read(self):
+        import pandas as pd  # pip install pandas openpyxl
+
+        with probe.span("unaids.read", path=self.xlsx):
+            return pd.read_excel(self.xlsx, sheet_name=[0, 1, 2, 3])
+
     def sheet_img(self, data, model, sets):
+        probe.add("unaids.sheet_img")
         image, (a, b), (c, d) = [], (data[0][0], data[0][-1]), self.time
         n = self.num_5(b + 1)
         matrix = [
@@ -42,6 +62,38 @@ class UNAIDS:
                 image.append({**img, "data": self.sheet_num(model, **img)})
         return image
 
+    def tree(self, level=2, sheet=1):
+        import pandas as pd  # pip install pandas
+
+        name = self.data[sheet]
+        name = pd.unique(name[name.index >= 7].iloc[:, 2].dropna())
+        reg = np.isin(name, list(self.region))
+        up = np.where(reg & (name != "Global"), np.arange(len(name)), -1)
+        up = np.maximum.accumulate(up)
+        up = np.where(up >= 0, name[up], "")
+        region = [i for i in self.world[1:] if i in set(name)]
+        leaf, up = (region, region) if level < 2 else (name[~reg], up[~reg])
+        group = np.array([region.index(i) if i in region else -1 for i in up], int)
+        node = ["Global", *region, *leaf][: len(region) + 1 if level < 2 else None]
+        data, col = np.zeros((len(node), len(leaf))), np.flatnonzero(group >= 0)
+        data[0, col], data[1 + group[col], col] = 1, 1
+        if level > 1:
+            data[1 + len(region) :] += np.eye(len(leaf))
+        return {"node": node, "leaf": list(leaf), "group": group, "sum": data}
+
+    def agg(self, tree, base, how="bottom"):
+        data, base = tree["sum"], np.asarray(base, dtype=np.float64)
+        leaf = np.nan_to_num(base[len(base) - data.shape[1] :])
+        if how == "top":
+            total = data[0] @ leaf
+            with np.errstate(divide="ignore", invalid="ignore"):
+                leaf = np.nan_to_num(leaf / total) * base[0]
+        elif how == "reconcile":
+            keep = ~np.isnan(base).any(1) / data.sum(1)
+            w = data.T * keep
+            leaf = np.linalg.lstsq(w @ data, w @ np.nan_to_num(base), rcond=None)[0]
+        return data @ leaf
+
     def sheet_div(self, a, b):
         return [a[0], np.array(a[1]) / np.array(b[1])]
 
@@ -51,7 +103,7 @@ class UNAIDS:
         return [n(a), n(b)]
 
     def sheet_sum(self, data, time, sets):
-        data = data[0][0], sum(y for _, y in data)
+        data = data[0], data[1].sum(0)
         return self.sheet_cut(data, time, sets)
 
     def sheet_cut(self, data, time, sets):
@@ -69,34 +121,124 @@ class UNAIDS:
         return zip(*[[i, j] for i, j in zip(*data) if check(i) and j])
 
     def sheet_num(self, model, time=[], line=False, space=1, **_):
-        _, params, run = model[0]
+        x, y, _ = self.sheet_mat([model], time, line, space)
+        return [x, y[0]]
+
+    def sheet_mat(self, model, time=[], line=False, space=1, dtype=np.float64):
+        name = list(model) if isinstance(model, dict) else range(len(model))
+        model = [model[i][0] for i in name]
         start, end = time or self.time
         x = np.arange(start, end + 1, space)
         x = np.linspace(start, end, 100) if line else x
-        y = run(x, *params)
-        return [x, y]
+        data, group = np.empty((len(model), len(x)), dtype=dtype), {}
+        # 2- and 3-param fits of one family (k fixed or free) stack separately
+        for i, (_, params, run) in enumerate(model):
+            group.setdefault((run, len(params)), []).append(i)
+        for (run, _), row in group.items():
+            params = np.array([model[i][1] for i in row], dtype=np.float64)
+            data[row] = run(x[None, :], *params.T[:, :, None])
+        return x, data, {a: b for b, a in enumerate(name)}
+
+    def rate(self, data, size=0):
+        data = np.asarray(data, dtype=np.float64)
+        n, m = data.shape
+        if not m:
+            window, none = np.zeros(n, dtype=int), np.full(n, np.nan)
+            sets = {"window": window, "start": none, "end": none, "year": window - 1}
+            return {**sets, "cagr": none, "slope": none}
+        have, col = ~np.isnan(data), np.arange(m)
+        count = have.sum(1)
+        if size:
+            window = np.minimum(count, size)
+        else:
+            # last occurrence of each value per row: stable sort, compare neighbours
+            order = np.argsort(data, 1, kind="stable")
+            value = np.take_along_axis(data, order, 1)
+            last = np.ones((n, m), dtype=bool)
+            last[:, :-1] = value[:, :-1] != value[:, 1:]
+            np.put_along_axis(last, order, last.copy(), 1)
+            seen = np.cumsum((have & last)[:, ::-1], 1) > 2
+            window = np.where(seen.any(1), seen.argmax(1) + 1, count)
+        keep = col >= m - window[:, None]
+        start = data[np.arange(n), np.minimum(m - window, m - 1)]
+        start, end, year = np.where(window > 0, start, np.nan), data[:, -1], window - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cagr = (end / start) ** (1 / year) - 1
+            x = np.where(keep, col, np.nan)
+            y = np.where(keep & (data > 0), np.log(np.where(data > 0, data, 1)), np.nan)
+            x, k = np.where(np.isnan(y), np.nan, x), (~np.isnan(y)).sum(1)[:, None]
+            x, y = x - np.nansum(x, 1)[:, None] / k, y - np.nansum(y, 1)[:, None] / k
+            slope = np.nansum(x * y, 1) / np.nansum(x * x, 1)
+        sets = {"window": window, "start": start, "end": end, "year": year}
+        return {**sets, "cagr": cagr, "slope": slope}
+
+    def rate_pad(self, data, group=None):
+        if group is None:
+            group = np.repeat(np.arange(len(data)), [len(i) for i in data])
+            data = [np.asarray(i, dtype=np.float64) for i in data]
+            data = np.concatenate(data or [[]])
+        group, data = np.asarray(group, dtype=int), np.asarray(data, dtype=np.float64)
+        order = np.argsort(group, kind="stable")
+        order = order[group[order] >= 0]
+        group, data = group[order], data[order]
+        size = np.bincount(group, minlength=group.max() + 1 if len(group) else 0)
+        n, m = len(size), size.max() if len(size) else 0
+        head = np.repeat(np.cumsum(size) - size, size)
+        col = np.arange(len(group)) - head + np.repeat(m - size, size)
+        matrix = np.full((n, m), np.nan)
+        matrix[group, col] = data
+        return matrix
 
-    def sheet_get(self, name, page=[], time=[], **_):
-        sets = {"name": name, "title": "Number"}
+    def sheet_get(self, name, page=[], time=[], bound=False, **_):
+        sets = {"name": name, "title": "Number", "bound": bound}
         sets["start"] = (time or self.time)[0]
         sets["sheet"], sets["index"] = page or (1, 30)
         return self.sheet(**sets)
 
-    def sheet(self, sheet, name="", index=0, title="", start=0, every=False):
-        data = self.data[sheet].copy()
-        data = data[data.index >= 7]
+    def sheet(
+        self, sheet, name="", index=0, title="", start=0, every=False, bound=False
+    ):
         if every:
-            return data
-        data = data[data.iloc[:, 2] == name]
-        data = data.iloc[:, [0, index]]
-        data.columns = ["Time", title]
-        a, b = data.columns
-        data[a] = pd.to_numeric(data[a])
-        data = data[data[a] >= start]
-        data = data[~data[b].isin(["..."])]
-        data = self.num_all(data)
-        data = [np.array(data[i]) for i in data.columns]
-        return data
+            data = self.data[sheet]
+            return data[data.index >= 7]
+        probe.add("unaids.sheet")
+        book = self.book_get(sheet)
+        rows = book["rows"].get(name, slice(0, 0))
+        data, miss, _ = self.book_col(book, index)
+        time, data, miss = book["time"][rows], data[rows], miss[rows]
+        keep, size = (time >= start) & ~miss, book["data"].shape[1]
+        if bound and index + 2 < size:
+            col = [self.book_col(book, index + i)[0:2] for i in (1, 2)]
+            col = [np.where(b[rows], np.nan, a[rows])[keep] for a, b in col]
+            return [time[keep], data[keep], *col]
+        return [time[keep], data[keep]]
+
+    def book_get(self, sheet):
+        if sheet in self.book:
+            return self.book[sheet]
+        with probe.span("unaids.book", sheet=sheet):
+            return self.book_set(sheet)
+
+    def book_set(self, sheet):
+        import pandas as pd  # pip install pandas
+
+        data = self.data[sheet]
+        data = data[data.index >= 7]
+        name = pd.Categorical(data.iloc[:, 2])
+        sort = np.argsort(name.codes, kind="stable")
+        data, code = data.iloc[sort], name.codes[sort]
+        edge = np.flatnonzero(np.diff(code)) + 1
+        edge = zip(np.r_[0, edge], np.r_[edge, len(code)])
+        rows = {name.categories[code[a]]: slice(a, b) for a, b in edge if code[a] >= 0}
+        time = pd.to_numeric(data.iloc[:, 0], errors="coerce").to_numpy()
+        book = {"name": name[sort], "rows": rows, "time": time, "data": data}
+        self.book[sheet] = {**book, "cols": {}}
+        return self.book[sheet]
+
+    def book_col(self, book, index):
+        if not index in book["cols"]:
+            book["cols"][index] = self.num_col(book["data"].iloc[:, index])
+        return book["cols"][index]
 
     def num(self, value):
         if type(value) == type(""):
@@ -117,10 +259,33 @@ class UNAIDS:
         stp = str(stp) if type(stp) == type(1) else ""
         return f"{value/num:.2f}".rstrip(stp).rstrip(".") + unit
 
-    def num_all(self, data):
-        for i in data.columns[1::]:
-            data[i] = data[i].apply(self.num)
-        return data
+    def num_col(self, data):
+        import pandas as pd  # pip install pandas
+
+        data = pd.Series(np.asarray(data, dtype=object))
+        kind = (data.map(type) == str).to_numpy()
+        value = pd.to_numeric(data.where(~kind), errors="coerce")
+        value = np.array(value, dtype=np.float64)
+        miss, cens = np.zeros((2, len(value)), dtype=bool)
+        if kind.any():
+            text = data[kind].to_numpy(str)
+            value[kind], miss[kind], cens[kind] = self.num_str(text)
+        return value, miss, cens
+
+    def num_str(self, text):
+        find = lambda x: np.char.find(text, x) >= 0
+        cens, unit = find("<") | find(">"), np.where(find("m") | find("M"), 1e6, 1)
+        for i in ", <>mM":
+            text = np.char.replace(text, i, "")
+        miss = text == "..."
+        text = np.where(miss, "nan", text)
+        try:
+            value = text.astype(np.float64)
+        except ValueError:
+            import pandas as pd  # pip install pandas
+
+            value = pd.to_numeric(text, errors="coerce").astype(np.float64)
+        return value * unit, miss | np.isnan(value), cens
 
     def num_per(self, num, *_):
         return f"{num:.0f}%"
@@ -0,0 +1,115 @@
+import glob, hashlib, os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from probe import probe
+from rheast import rheast
+
+
+class Vintage:
+    def __init__(self) -> None:
+        self.path = os.path.join(rheast.file, "vintage")
+        self.image = os.path.join(rheast.image, "vintage")
+        self.page, self.space, self.workers = [(1, 30), (1, 27)], 5, 0
+        self.book, self.model, self.frame = [], [], []
+        return
+
+    def run(self, path="", workers=0):
+        path = sorted(glob.glob(os.path.join(path or self.path, "*.xls*")))
+        workers = min(workers or self.workers or os.cpu_count() or 1, len(path))
+        with probe.span("vintage.ingest", book=len(path), workers=workers):
+            if workers > 1:
+                with ProcessPoolExecutor(workers) as pool:
+                    book = list(pool.map(self.ingest, path))
+            else:
+                book = [self.ingest(i) for i in path]
+        self.book = sorted(book, key=lambda x: (x["year"], x["name"]))
+        with probe.span("vintage.fit", book=len(book)):
+            self.model = self.fit(self.book)
+        os.makedirs(self.image, exist_ok=True)
+        self.frame = [self.table(*i) for i in zip(self.book, self.model)]
+        return self.diff(self.book, self.frame)
+
+    def ingest(self, path):
+        from unaids import UNAIDS
+
+        book, data, key = UNAIDS().open(path), {}, {}
+        name = book.sheet(1, every=True).iloc[:, 2].dropna().unique()
+        for i in name:
+            for page in self.page:
+                x, y = book.sheet_get(i, page)
+                if len(set(y)) > 1:
+                    break
+            data[i] = [x, y] if len(x) > 1 else None
+            key[i] = self.key(data[i]) if data[i] else ""
+        name = os.path.splitext(os.path.basename(path))[0]
+        year = int(max([i[0][-1] + 1 for i in data.values() if i] or [rheast.year]))
+        return {"name": name, "year": year, "data": data, "key": key}
+
+    def key(self, data):
+        x, y = [np.asarray(i, dtype=np.float64) for i in data]
+        return hashlib.sha1(x.tobytes() + y.tobytes()).hexdigest()
+
+    # a series is fit with its own horizon, so identical content fits once
+    def fit(self, book):
+        matrix, todo = [{} for _ in book], {}
+        for i, e in enumerate(book):
+            for name, data in e["data"].items():
+                if data:
+                    todo.setdefault(e["key"][name], [data, []])[1].append([i, name])
+        probe.add("vintage.series", sum(len(i[1]) for i in todo.values()))
+        probe.add("vintage.fit", len(todo))
+        year = {}
+        for data, where in todo.values():
+            year.setdefault(int(data[0][-1]) + 1, []).append([data, where])
+        for n, data in sorted(year.items()):
+            model = rheast.fit_many([e[0] for e in data], year=n)
+            for (_, where), m in zip(data, model):
+                for i, name in where:
+                    matrix[i][name] = m
+        return matrix
+
+    def table(self, book, model):
+        import pandas as pd  # pip install pandas
+        from unaids import unaids
+
+        model = {a: b for a, b in model.items() if b}
+        time = (unaids.num_5(book["year"]), unaids.time[1])
+        x, data, index = unaids.sheet_mat(model, time, space=self.space)
+        data = pd.DataFrame(data, index=list(index), columns=x.astype(int))
+        data.insert(0, "model", [model[i][0][2].__name__ for i in index])
+        data.insert(1, "r2", [model[i][0][0] for i in index])
+        data.insert(2, "last", [book["data"][i][1][-1] for i in index])
+        data.insert(3, "key", [book["key"][i][:12] for i in index])
+        data.index.name = "name"
+        path = os.path.join(self.image, f"{book['name']}.txt")
+        data.to_csv(path, sep="\t", float_format="%.6g")
+        return data
+
+    def diff(self, book, frame):
+        import pandas as pd  # pip install pandas
+
+        matrix, text = [], []
+        for i in range(1, len(book)):
+            a, b = frame[i - 1], frame[i]
+            end = [i for i in b.columns[4:] if i in a.columns][-1:]
+            data = a.join(b, how="outer", lsuffix="_a", rsuffix="_b")
+            data = data[data["key_a"] != data["key_b"]]
+            model = data["model_a"].fillna("-") + ">" + data["model_b"].fillna("-")
+            data = data[[f"{e}_{n}" for e in ["last", *end] for n in "ab"]]
+            data.insert(0, "model", model)
+            if end:
+                data["change"] = data[f"{end[0]}_b"] / data[f"{end[0]}_a"] - 1
+                data = data.sort_values("change", key=abs, ascending=False)
+            name = f"{book[i - 1]['name']} -> {book[i]['name']}"
+            text.append(f"{name}: {len(data)} of {len(b)} series changed")
+            text.append(data.to_string(float_format=lambda x: f"{x:.6g}"))
+            matrix.append(data.assign(vintage=name))
+        with open(os.path.join(self.image, "diff.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(text) + "\n")
+        return pd.concat(matrix) if matrix else pd.DataFrame()
+
+
+vintage = Vintage()
+
+if __name__ == "__main__":
+    print(vintage.run().head(20).to_string())